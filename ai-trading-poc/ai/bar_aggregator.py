@@ -0,0 +1,503 @@
+"""
+ストリーミング足生成 - ティック/クオートから1分足OHLCを生成（asyncio）
+"""
+
+import os
+import sys
+import csv
+import time
+import asyncio
+import argparse
+import logging
+from collections import deque
+import yaml
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from dotenv import load_dotenv
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class Tick:
+    """1ティック（時刻と価格）"""
+
+    __slots__ = ('timestamp', 'price')
+
+    def __init__(self, timestamp, price):
+        self.timestamp = timestamp
+        self.price = price
+
+
+class TickSource:
+    """
+    ティックソースの基底クラス
+
+    ``async for tick in source`` で Tick を順に返す。
+    実際のストリーム（WebSocket等）はこのクラスを継承して ``__aiter__`` を実装する。
+    """
+
+    def __aiter__(self):
+        raise NotImplementedError
+
+
+class ReplayTickSource(TickSource):
+    """
+    CSVファイルからティックを再生するソース（テスト/検証用）
+
+    CSV形式: timestamp,price （bid/ask の場合は mid を price とする）
+    """
+
+    def __init__(self, path, speed=None):
+        """
+        Args:
+            path (str): ティックCSVのパス
+            speed (float): 再生速度倍率（None は待ち時間なしで最速再生）
+        """
+        self.path = Path(path)
+        self.speed = speed
+
+    async def __aiter__(self):
+        previous = None
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                timestamp = pd.Timestamp(row['timestamp'])
+                if 'price' in row:
+                    price = float(row['price'])
+                else:
+                    price = (float(row['bid']) + float(row['ask'])) / 2
+
+                if self.speed is not None and previous is not None:
+                    delay = (timestamp - previous).total_seconds() / self.speed
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                previous = max(previous, timestamp) if previous is not None else timestamp
+
+                yield Tick(timestamp, price)
+
+
+class BarAggregator:
+    """
+    ティックを時間境界ごとのOHLC足に集約するクラス
+
+    - 足の終了時刻 + 許容遅延 をウォーターマークが超えた時点で確定
+    - 許容遅延内の順序違いティックは該当する足に反映
+    - 確定済みの足に対する遅延ティックは破棄してカウント
+    """
+
+    def __init__(self, config_path='config.yaml'):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        stream_config = self.config['stream']
+
+        self.interval = pd.Timedelta(self.config['data']['interval'])
+        self.late_tolerance = pd.Timedelta(seconds=stream_config['late_tolerance_seconds'])
+        # タイムゾーン無しのティック時刻をどの地域の時刻とみなすか（壁時計との比較用）
+        self.timezone = stream_config['timezone']
+        self.tick_tz = None
+
+        self.open_bars = {}
+        self.last_closed = None
+        self.watermark = None
+        self.sinks = []
+
+        self.stats = {
+            'ticks': 0,
+            'late_ticks_dropped': 0,
+            'bars_closed': 0,
+        }
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def add_sink(self, sink):
+        """確定足の受け取り先を登録（sink(bar) の同期/非同期関数）"""
+        self.sinks.append(sink)
+
+    async def on_tick(self, tick):
+        """
+        1ティックを反映
+
+        Args:
+            tick (Tick): ティック
+        """
+        self.stats['ticks'] += 1
+        self.tick_tz = tick.timestamp.tz
+        bar_start = tick.timestamp.floor(self.interval)
+
+        if self.last_closed is not None and bar_start <= self.last_closed:
+            self.stats['late_ticks_dropped'] += 1
+            logger.debug(f"Dropped late tick at {tick.timestamp}")
+            return
+
+        bar = self.open_bars.get(bar_start)
+        if bar is None:
+            self.open_bars[bar_start] = {
+                'open': tick.price, 'high': tick.price,
+                'low': tick.price, 'close': tick.price,
+                'first_ts': tick.timestamp, 'last_ts': tick.timestamp,
+            }
+        else:
+            bar['high'] = max(bar['high'], tick.price)
+            bar['low'] = min(bar['low'], tick.price)
+            # 順序違いのティックでも時刻順で始値/終値を決める
+            if tick.timestamp < bar['first_ts']:
+                bar['open'], bar['first_ts'] = tick.price, tick.timestamp
+            if tick.timestamp >= bar['last_ts']:
+                bar['close'], bar['last_ts'] = tick.price, tick.timestamp
+
+        if self.watermark is None or tick.timestamp > self.watermark:
+            self.watermark = tick.timestamp
+            await self.advance(self.watermark)
+
+    async def advance(self, now):
+        """
+        時刻 now までに確定できる足を閉じる
+
+        ライブ運用ではティックが途切れても足を確定できるよう，
+        タイマーから壁時計の時刻で呼び出す。
+        """
+        cutoff = now - self.late_tolerance
+        ready = sorted(start for start in self.open_bars if start + self.interval <= cutoff)
+
+        for start in ready:
+            await self._close_bar(start)
+
+    async def flush(self):
+        """未確定の足をすべて確定（ストリーム終了時）"""
+        for start in sorted(self.open_bars):
+            await self._close_bar(start)
+
+    async def _close_bar(self, start):
+        """足を確定して sink に渡す"""
+        raw = self.open_bars.pop(start, None)
+        if raw is None:
+            # タイマーとティック処理が同じ足を閉じようとした場合
+            return
+        bar = pd.Series(
+            {col: raw[col] for col in ('open', 'high', 'low', 'close')},
+            name=start
+        )
+        self.last_closed = start
+        self.stats['bars_closed'] += 1
+
+        for sink in self.sinks:
+            result = sink(bar)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def run(self, source, clock_interval=None):
+        """
+        ソースを最後まで消費
+
+        Args:
+            source (TickSource): ティックソース
+            clock_interval (float): 壁時計で足を確定する間隔（秒，ライブ用）
+        """
+        clock_task = None
+        if clock_interval is not None:
+            clock_task = asyncio.create_task(self._clock(clock_interval))
+
+        try:
+            async for tick in source:
+                await self.on_tick(tick)
+            await self.flush()
+        finally:
+            if clock_task is not None:
+                clock_task.cancel()
+
+        logger.info(
+            f"✅ Stream finished: {self.stats['ticks']} ticks, "
+            f"{self.stats['bars_closed']} bars, "
+            f"{self.stats['late_ticks_dropped']} late ticks dropped"
+        )
+
+    def _now(self):
+        """壁時計の現在時刻（ティックの時刻と同じタイムゾーン表現）"""
+        now = pd.Timestamp.now(tz=self.tick_tz or self.timezone)
+        if self.tick_tz is None:
+            # タイムゾーン無しのティックは stream.timezone の時刻とみなす
+            now = now.tz_localize(None)
+        return now
+
+    async def _clock(self, interval):
+        """一定間隔で壁時計の時刻までの足を確定"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.advance(self._now())
+            except Exception as e:
+                # タスク内の例外は表に出ないため，ログに残して時計を止めない
+                logger.error(f"❌ Failed to close bars by wall clock: {e}")
+
+
+class BarStore:
+    """確定足をCSVに追記するsink"""
+
+    def __init__(self, config_path='config.yaml', symbol='USDJPY'):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        bars_path = Path(self.config['stream']['bars_path'])
+        bars_path.mkdir(parents=True, exist_ok=True)
+        self.filename = bars_path / f"{symbol}_bars.csv"
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def __call__(self, bar):
+        """1本追記"""
+        write_header = not self.filename.exists()
+        with open(self.filename, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(['timestamp', 'open', 'high', 'low', 'close'])
+            writer.writerow([bar.name.isoformat(), bar['open'], bar['high'], bar['low'], bar['close']])
+
+
+class LiveFeatureUpdater:
+    """
+    直近の確定足を固定長で保持し，足確定ごとに特徴量を更新するsink
+
+    クロスアセット特徴量は CrossAssetFeatures を保持し続けて1本ごとに update() する
+    （足ごとにバスケットのCSVを読み直して全体を transform() しない）。
+    バスケット各ペアの確定足は basket_sink() を各ペアの BarAggregator に登録して流す。
+    学習時の transform()（バスケットを基準ペアの時刻に前方補完）と揃えるため，
+    基準ペアの足 T は全バスケットの足 T 以降が届くまで保留してから処理する
+    （basket_max_wait_bars 本を超えて保留した足は届いている終値で処理）。
+    """
+
+    def __init__(self, config_path='config.yaml', on_features=None):
+        """
+        Args:
+            config_path (str): コンフィグのパス
+            on_features (callable): 特徴量更新時のコールバック on_features(features_df)
+        """
+        import feature_engineer
+
+        self.engineer = feature_engineer.FeatureEngineer(config_path)
+        stream_config = self.engineer.config['stream']
+        window = stream_config['window_bars']
+        self.bars = deque(maxlen=window)
+        self.on_features = on_features
+        self.latest_features = None
+        self.latencies = deque(maxlen=window)
+
+        self.cross = None
+        if self.engineer.config.get('cross_asset', {}).get('enabled', False):
+            import cross_asset
+
+            self.cross = cross_asset.CrossAssetFeatures(config_path)
+            self.cross_rows = deque(maxlen=window)
+            self.max_wait_bars = stream_config['basket_max_wait_bars']
+            self.pending = deque()
+            # ペアごとの未反映の確定足 (足の開始時刻, 終値) と受け取った最新の足の時刻
+            self.basket_bars = {symbol: deque() for symbol in self.cross.symbols}
+            self.basket_latest = {}
+            # 起動時のみ保存済みデータの最新終値で初期化（ライブの足が届くまでの前方補完）
+            stored = cross_asset.load_basket_closes(config_path)
+            self.basket_closes = {
+                symbol: float(closes.dropna().iloc[-1])
+                for symbol, closes in stored.items() if closes.notna().any()
+            }
+
+    def basket_sink(self, symbol):
+        """バスケットのペアの BarAggregator に登録するsink"""
+        return lambda bar: self.update_basket(symbol, bar.name, bar['close'])
+
+    async def update_basket(self, symbol, bar_start, close):
+        """
+        バスケットのペアの確定足を受け取り，揃った基準ペアの足を処理
+
+        Args:
+            symbol (str): バスケットの通貨ペア
+            bar_start (pd.Timestamp): 足の開始時刻
+            close (float): 終値
+        """
+        self.basket_bars[symbol].append((bar_start, float(close)))
+        self.basket_latest[symbol] = bar_start
+        await self._drain()
+
+    async def __call__(self, bar):
+        """足を追加して特徴量を再計算（クロスアセット有効時はバスケットが揃うまで保留）"""
+        if self.cross is None:
+            await self._process(bar)
+            return
+
+        self.pending.append(bar)
+        await self._drain()
+
+    async def flush(self):
+        """保留中の足を届いている終値ですべて処理（ストリーム終了時）"""
+        if self.cross is None:
+            return
+
+        while self.pending:
+            await self._process(self.pending.popleft())
+
+    def _basket_ready(self, bar_start):
+        """全バスケットの足 bar_start 以降が届いているか"""
+        return all(
+            symbol in self.basket_latest and self.basket_latest[symbol] >= bar_start
+            for symbol in self.cross.symbols
+        )
+
+    async def _drain(self):
+        """バスケットが揃った（または待ちきれない）保留中の足を順に処理"""
+        while self.pending and (
+            self._basket_ready(self.pending[0].name) or
+            len(self.pending) > self.max_wait_bars
+        ):
+            await self._process(self.pending.popleft())
+
+    def _cross_row(self, bar):
+        """1本分のクロスアセット特徴量（バスケットの終値が揃うまでは NaN）"""
+        # 足の開始時刻までのバスケットの終値を反映（transform() の前方補完と同じ）
+        for symbol, pending_bars in self.basket_bars.items():
+            while pending_bars and pending_bars[0][0] <= bar.name:
+                self.basket_closes[symbol] = pending_bars.popleft()[1]
+
+        closes = [self.basket_closes.get(symbol) for symbol in self.cross.symbols]
+        if None in closes or pd.isna(bar['close']):
+            return np.full(len(self.cross.columns), np.nan)
+        return self.cross.update(bar['close'], closes)
+
+    async def _process(self, bar):
+        """足を追加して特徴量を再計算"""
+        start = time.perf_counter()
+        self.bars.append(bar)
+
+        df = pd.DataFrame(list(self.bars))
+        cross_features = None
+        if self.cross is not None:
+            self.cross_rows.append(self._cross_row(bar))
+            cross_features = pd.DataFrame(
+                list(self.cross_rows), index=df.index, columns=self.cross.columns
+            )
+
+        features = self.engineer.engineer_features(
+            df, include_target=False, cross_features=cross_features
+        )
+        if features is None or len(features) == 0:
+            return
+
+        self.latest_features = features
+        if self.on_features is not None:
+            result = self.on_features(features)
+            if asyncio.iscoroutine(result):
+                await result
+
+        self.latencies.append(time.perf_counter() - start)
+
+
+async def _next_tick(ticks):
+    """ティックのイテレータから次の1件（終端なら None）"""
+    try:
+        return await ticks.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def replay_merged(streams, speed=None):
+    """
+    複数ペアのティックCSVを時刻順に1本にまとめて再生
+
+    ペアごとに別タスクで最速再生すると1つのペアだけ先に最後まで進むため，
+    全ペアのティックを時刻順に各 BarAggregator へ渡す。
+
+    Args:
+        streams (list): (BarAggregator, ティックCSVのパス) のリスト
+        speed (float): 再生速度倍率（None は待ち時間なしで最速再生）
+    """
+    iterators = [ReplayTickSource(path).__aiter__() for _, path in streams]
+    heads = [await _next_tick(ticks) for ticks in iterators]
+    previous = None
+
+    while any(tick is not None for tick in heads):
+        i = min(
+            (i for i, tick in enumerate(heads) if tick is not None),
+            key=lambda i: heads[i].timestamp
+        )
+        tick = heads[i]
+
+        if speed is not None and previous is not None:
+            delay = (tick.timestamp - previous).total_seconds() / speed
+            if delay > 0:
+                await asyncio.sleep(delay)
+        previous = max(previous, tick.timestamp) if previous is not None else tick.timestamp
+
+        await streams[i][0].on_tick(tick)
+        heads[i] = await _next_tick(iterators[i])
+
+    for aggregator, _ in streams:
+        await aggregator.flush()
+
+
+def main():
+    """メイン処理（ティックCSVを再生）"""
+    parser = argparse.ArgumentParser(description='Replay ticks through the bar aggregator')
+    parser.add_argument('ticks', help='基準ペアのティックCSV')
+    parser.add_argument('speed', nargs='?', type=float, default=None,
+                        help='再生倍率（省略時は最速）')
+    parser.add_argument('--basket', action='append', default=[], metavar='SYMBOL=CSV',
+                        help='クロスアセット用のバスケットのペアのティックCSV（複数指定可）')
+    args = parser.parse_args()
+
+    logger.info("=" * 50)
+    logger.info("📡 Tick-to-Bar Aggregation (replay)")
+    logger.info("=" * 50)
+
+    aggregator = BarAggregator('config.yaml')
+    updater = LiveFeatureUpdater('config.yaml')
+    aggregator.add_sink(BarStore('config.yaml', 'USDJPY'))
+    aggregator.add_sink(updater)
+
+    # バスケットのペアごとに足を作り，確定足を特徴量更新に流す
+    streams = [(aggregator, args.ticks)]
+    for spec in args.basket:
+        symbol, path = spec.split('=', 1)
+        basket_aggregator = BarAggregator('config.yaml')
+        basket_aggregator.add_sink(updater.basket_sink(symbol))
+        streams.append((basket_aggregator, path))
+
+    if updater.cross is not None:
+        missing = set(updater.cross.symbols) - {spec.split('=', 1)[0] for spec in args.basket}
+        if missing:
+            logger.warning(
+                f"No basket ticks for {', '.join(sorted(missing))}: "
+                "cross-asset features stay NaN until every basket symbol is streamed"
+            )
+
+    async def replay():
+        if len(streams) == 1:
+            await aggregator.run(ReplayTickSource(args.ticks, speed=args.speed))
+        else:
+            await replay_merged(streams, speed=args.speed)
+        await updater.flush()
+
+    asyncio.run(replay())
+
+    if updater.latencies:
+        latencies = sorted(updater.latencies)
+        p50 = latencies[len(latencies) // 2] * 1000
+        logger.info(f"⏱️  Feature update after bar close: p50 {p50:.2f}ms")
+
+    return aggregator.stats
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+クロスアセット特徴量 - 通貨ペアバスケットとのローリング相関/ベータ/スプレッドZスコア
+"""
+
+import os
+import logging
+import yaml
+import pandas as pd
+import numpy as np
+from dotenv import load_dotenv
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class CrossAssetFeatures:
+    """
+    基準通貨ペアとバスケット各ペアのローリング統計を逐次更新するクラス
+
+    ウィンドウ内の和（リターン, 2乗, 積, スプレッド）だけを保持し，
+    1本ごとに入る値を足して出る値を引くため，1本あたりの計算量は
+    バスケットのペア数に比例する（N×N のローリング相関を再計算しない）。
+    スプレッド（対数価格の差，水準 ~5 に対し分散 ~1e-8）はそのまま2乗和を取ると
+    桁落ちするため，基準値（再同期ごとにウィンドウ平均）からの差で保持する。
+    """
+
+    def __init__(self, config_path='config.yaml'):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        cross_config = self.config['cross_asset']
+
+        self.base_symbol = self.config['data']['symbol']
+        self.symbols = list(cross_config['symbols'])
+        self.window = cross_config['window']
+
+        self.columns = (
+            [f'corr_{s}' for s in self.symbols] +
+            [f'beta_{s}' for s in self.symbols] +
+            [f'spread_z_{s}' for s in self.symbols]
+        )
+        self.reset()
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def reset(self):
+        """状態を初期化"""
+        k = len(self.symbols)
+
+        self._prev_log_price = None
+        self._spread_offset = None
+        # 出ていく値を引くためのリングバッファ（ウィンドウ長で固定）
+        self._base_returns = np.zeros(self.window)
+        self._returns = np.zeros((self.window, k))
+        self._spreads = np.zeros((self.window, k))
+        self._pos = 0
+        self._count = 0
+        self._since_resync = 0
+
+        self._sum_x = 0.0
+        self._sum_xx = 0.0
+        self._sum_y = np.zeros(k)
+        self._sum_yy = np.zeros(k)
+        self._sum_xy = np.zeros(k)
+        self._sum_s = np.zeros(k)
+        self._sum_ss = np.zeros(k)
+
+    def _resync(self):
+        """丸め誤差の蓄積を防ぐため，バッファから和を再計算"""
+        # スプレッドの基準値をウィンドウ平均に取り直す（再同期時はバッファが埋まっている）
+        shift = self._spreads.mean(axis=0)
+        self._spreads -= shift
+        self._spread_offset = self._spread_offset + shift
+
+        x, y, s = self._base_returns, self._returns, self._spreads
+        self._sum_x = x.sum()
+        self._sum_xx = (x * x).sum()
+        self._sum_y = y.sum(axis=0)
+        self._sum_yy = (y * y).sum(axis=0)
+        self._sum_xy = (x[:, None] * y).sum(axis=0)
+        self._sum_s = s.sum(axis=0)
+        self._sum_ss = (s * s).sum(axis=0)
+        self._since_resync = 0
+
+    def update(self, base_close, closes):
+        """
+        1本分の終値で統計を更新
+
+        Args:
+            base_close (float): 基準通貨ペアの終値
+            closes (array-like): バスケット各ペアの終値（self.symbols の順）
+
+        Returns:
+            np.ndarray: self.columns 順の特徴量（ウィンドウが埋まるまでは NaN）
+        """
+        log_price = np.log(np.concatenate([[base_close], np.asarray(closes, dtype=float)]))
+
+        if self._prev_log_price is None:
+            self._prev_log_price = log_price
+            self._spread_offset = log_price[0] - log_price[1:]
+            return np.full(len(self.columns), np.nan)
+
+        returns = log_price - self._prev_log_price
+        self._prev_log_price = log_price
+
+        x_new = returns[0]
+        y_new = returns[1:]
+        s_new = log_price[0] - log_price[1:] - self._spread_offset
+
+        # ウィンドウから出る値（未充填の間は0なので和に影響しない）
+        x_old = self._base_returns[self._pos]
+        y_old = self._returns[self._pos]
+        s_old = self._spreads[self._pos]
+
+        self._sum_x += x_new - x_old
+        self._sum_xx += x_new * x_new - x_old * x_old
+        self._sum_y += y_new - y_old
+        self._sum_yy += y_new * y_new - y_old * y_old
+        self._sum_xy += x_new * y_new - x_old * y_old
+        self._sum_s += s_new - s_old
+        self._sum_ss += s_new * s_new - s_old * s_old
+
+        self._base_returns[self._pos] = x_new
+        self._returns[self._pos] = y_new
+        self._spreads[self._pos] = s_new
+        self._pos = (self._pos + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            self._resync()
+            # 基準値を取り直したので今回のスプレッドもバッファの値に合わせる
+            s_new = self._spreads[self._pos - 1]
+
+        if self._count < self.window:
+            return np.full(len(self.columns), np.nan)
+
+        n = self.window
+        cov_xy = self._sum_xy / n - (self._sum_x / n) * (self._sum_y / n)
+        var_x = self._sum_xx / n - (self._sum_x / n) ** 2
+        var_y = self._sum_yy / n - (self._sum_y / n) ** 2
+        mean_s = self._sum_s / n
+        var_s = self._sum_ss / n - mean_s ** 2
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov_xy / np.sqrt(np.maximum(var_x, 0) * np.maximum(var_y, 0))
+            beta = cov_xy / var_y
+            spread_z = (s_new - mean_s) / np.sqrt(np.maximum(var_s, 0))
+
+        return np.concatenate([corr, beta, spread_z])
+
+    def transform(self, base_close, basket_closes):
+        """
+        時系列全体を逐次更新で処理（学習/推論で同じ計算経路を使う）
+
+        Args:
+            base_close (pd.Series): 基準通貨ペアの終値
+            basket_closes (pd.DataFrame): バスケット各ペアの終値（列 = 通貨ペア）
+
+        Returns:
+            pd.DataFrame: base_close と同じインデックスのクロスアセット特徴量
+        """
+        self.reset()
+
+        # 基準ペアの時刻に揃え，欠けている足は直前の値で埋める
+        aligned = basket_closes.reindex(columns=self.symbols)
+        aligned = aligned.reindex(base_close.index, method='ffill')
+
+        base_values = base_close.to_numpy(dtype=float)
+        basket_values = aligned.to_numpy(dtype=float)
+        output = np.full((len(base_values), len(self.columns)), np.nan)
+
+        for i in range(len(base_values)):
+            if np.isnan(base_values[i]) or np.isnan(basket_values[i]).any():
+                continue
+            output[i] = self.update(base_values[i], basket_values[i])
+
+        return pd.DataFrame(output, index=base_close.index, columns=self.columns)
+
+
+def load_basket_closes(config_path='config.yaml', days=None):
+    """
+    バスケット各ペアの保存済み終値を読み込む
+
+    Returns:
+        pd.DataFrame: 列 = 通貨ペア の終値（データが無いペアは含まない）
+    """
+    import fetch_data
+
+    config = CrossAssetFeatures._load_config(config_path)
+    days = days or config['data']['lookback_days']
+    fetcher = fetch_data.DataFetcher(config_path)
+
+    closes = {}
+    for symbol in config['cross_asset']['symbols']:
+        df = fetcher.get_latest_data(symbol, days=days)
+        if df is None or len(df) == 0:
+            logger.warning(f"No stored data for basket symbol {symbol}")
+            continue
+        closes[symbol] = df['close']
+
+    return pd.DataFrame(closes)
@@ -0,0 +1,279 @@
+"""
+ドリフト監視 - 学習時の分布と推論時の特徴量/確率分布を固定サイズのヒストグラムで比較
+"""
+
+import os
+import json
+import logging
+import tempfile
+from datetime import datetime
+import yaml
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from dotenv import load_dotenv
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ゼロ割り・log(0) 回避用
+EPSILON = 1e-6
+
+PROBA_COLUMNS = ['proba_SHORT', 'proba_LONG', 'proba_NO_TRADE']
+
+
+def _write_json_atomic(path, obj, **dump_kwargs):
+    """
+    JSONを別名に書いてから置き換える
+
+    同時に動く predict.py やバックエンドが書きかけのファイルを読まないようにする
+    """
+    with tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=path.parent,
+        prefix=f"{path.stem}.", suffix='.tmp', delete=False
+    ) as f:
+        tmp_file = f.name
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, **dump_kwargs)
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def build_reference_profile(X, pred_proba, num_bins=10, exclude_columns=()):
+    """
+    学習時に取り分けた検証データから参照プロファイル（ビン境界と度数）を作成
+
+    学習データそのものに対する予測確率は過学習で偏るため，
+    本番の推論と同じ条件になる未学習の行を使う。
+
+    Args:
+        X (pd.DataFrame): 検証データの特徴量
+        pred_proba (np.ndarray): 検証データに対する予測確率
+        num_bins (int): 1列あたりのビン数
+        exclude_columns (list): 監視しない列（価格水準など常に変化する列）
+
+    Returns:
+        dict: 列名 -> {'edges': [...], 'counts': [...]}
+    """
+    columns = {
+        col: X[col].to_numpy(dtype=float)
+        for col in X.columns if col not in exclude_columns
+    }
+    for i, col in enumerate(PROBA_COLUMNS):
+        columns[col] = np.asarray(pred_proba)[:, i]
+
+    profile = {}
+    for col, values in columns.items():
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            continue
+
+        # 分位点で内側の境界を作る（離散値の列は重複を除く）
+        inner = np.unique(np.quantile(values, np.linspace(0, 1, num_bins + 1)[1:-1]))
+        counts = np.bincount(
+            np.searchsorted(inner, values, side='right'),
+            minlength=len(inner) + 1
+        )
+        profile[col] = {
+            'edges': inner.tolist(),
+            'counts': counts.astype(float).tolist(),
+        }
+
+    return profile
+
+
+class DriftMonitor:
+    """
+    ストリーミングドリフト監視クラス
+
+    各列について参照プロファイルと同じビンの度数だけを保持するため，
+    プロセスがどれだけ長く動いてもメモリ使用量は一定。
+    """
+
+    def __init__(self, config_path='config.yaml'):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        drift_config = self.config['drift']
+
+        self.psi_threshold = drift_config['psi_threshold']
+        self.ks_threshold = drift_config['ks_threshold']
+        self.min_samples = drift_config['min_samples']
+        self.decay = drift_config.get('decay', 1.0)
+
+        model_path = Path(self.config['model']['model_path'])
+        self.reference_file = model_path / drift_config['reference_filename']
+        self.state_file = model_path / drift_config['state_filename']
+        self.trigger_file = model_path / drift_config['trigger_filename']
+
+        self.reference = {}
+        self.live_counts = {}
+        self.num_samples = 0.0
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def load_reference(self):
+        """学習時に保存された参照プロファイルを読み込む"""
+        if not self.reference_file.exists():
+            logger.warning(f"Reference profile not found: {self.reference_file}")
+            return False
+
+        with open(self.reference_file, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+
+        self.reference = {
+            col: {
+                'edges': np.asarray(entry['edges'], dtype=float),
+                'counts': np.asarray(entry['counts'], dtype=float),
+            }
+            for col, entry in profile['columns'].items()
+        }
+        self.reset()
+        logger.info(f"✅ Reference profile loaded ({len(self.reference)} columns)")
+        return True
+
+    def reset(self):
+        """ライブ側の度数をクリア"""
+        self.live_counts = {
+            col: np.zeros_like(ref['counts']) for col, ref in self.reference.items()
+        }
+        self.num_samples = 0.0
+
+    def load_state(self):
+        """前回までのライブ度数を読み込む（プロセスを跨いで監視を継続）"""
+        if not self.state_file.exists():
+            return False
+
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            # 壊れた状態で推論を止めない（度数は最初から数え直す）
+            logger.warning(f"Unreadable drift state, starting fresh: {e}")
+            return False
+
+        # 参照プロファイルが更新されていれば古い度数は破棄
+        if state.get('reference_mtime') != self.reference_file.stat().st_mtime:
+            logger.info("Reference profile changed, discarding drift state")
+            return False
+
+        for col, counts in state['counts'].items():
+            if col in self.live_counts and len(counts) == len(self.live_counts[col]):
+                self.live_counts[col] = np.asarray(counts, dtype=float)
+        self.num_samples = state['num_samples']
+        return True
+
+    def save_state(self):
+        """ライブ度数を保存（サイズは列数×ビン数で固定）"""
+        state = {
+            'reference_mtime': self.reference_file.stat().st_mtime,
+            'num_samples': self.num_samples,
+            'counts': {col: counts.tolist() for col, counts in self.live_counts.items()},
+        }
+        _write_json_atomic(self.state_file, state)
+
+    def update(self, features_df, pred_proba):
+        """
+        新しい推論結果をヒストグラムに加算
+
+        Args:
+            features_df (pd.DataFrame): モデル入力の特徴量
+            pred_proba (np.ndarray): (n_rows, 3) の予測確率
+        """
+        if not self.reference:
+            return
+
+        pred_proba = np.atleast_2d(np.asarray(pred_proba, dtype=float))
+        n_rows = len(features_df)
+
+        if self.decay < 1.0:
+            # 古い観測ほど重みを下げる（指数減衰）
+            factor = self.decay ** n_rows
+            for counts in self.live_counts.values():
+                counts *= factor
+            self.num_samples *= factor
+
+        for col, ref in self.reference.items():
+            if col in PROBA_COLUMNS:
+                values = pred_proba[:, PROBA_COLUMNS.index(col)]
+            elif col in features_df.columns:
+                values = features_df[col].to_numpy(dtype=float)
+            else:
+                continue
+
+            values = values[~np.isnan(values)]
+            bins = np.searchsorted(ref['edges'], values, side='right')
+            self.live_counts[col] += np.bincount(bins, minlength=len(ref['counts']))
+
+        self.num_samples += n_rows
+
+    @staticmethod
+    def _psi(expected, actual):
+        """Population Stability Index"""
+        e = expected / max(expected.sum(), EPSILON) + EPSILON
+        a = actual / max(actual.sum(), EPSILON) + EPSILON
+        return float(np.sum((a - e) * np.log(a / e)))
+
+    @staticmethod
+    def _ks(expected, actual):
+        """ビン化した累積分布間の最大差（KS統計量の近似）"""
+        e = np.cumsum(expected) / max(expected.sum(), EPSILON)
+        a = np.cumsum(actual) / max(actual.sum(), EPSILON)
+        return float(np.max(np.abs(a - e)))
+
+    def check(self):
+        """
+        参照分布と比較して再学習が必要か判定
+
+        ドリフトを検出すると trigger_filename に結果を書く。バックエンドは
+        /health の retrain_recommended で通知し，RETRAIN_ON_DRIFT=true なら
+        学習ジョブを登録する（再学習で参照プロファイルを保存すると削除される）。
+
+        Returns:
+            dict: 列ごとの PSI/KS と再学習トリガー
+        """
+        report = {
+            'timestamp': datetime.now().isoformat() + 'Z',
+            'num_samples': self.num_samples,
+            'retrain': False,
+            'drifted_columns': [],
+            'columns': {},
+        }
+
+        if self.num_samples < self.min_samples:
+            return report
+
+        for col, ref in self.reference.items():
+            live = self.live_counts[col]
+            if live.sum() == 0:
+                continue
+
+            psi = self._psi(ref['counts'], live)
+            ks = self._ks(ref['counts'], live)
+            report['columns'][col] = {'psi': psi, 'ks': ks}
+
+            if psi > self.psi_threshold or ks > self.ks_threshold:
+                report['drifted_columns'].append(col)
+
+        if report['drifted_columns']:
+            report['retrain'] = True
+            logger.warning(
+                f"⚠️  Drift detected in: {', '.join(report['drifted_columns'])}"
+            )
+            _write_json_atomic(self.trigger_file, report, indent=2, ensure_ascii=False)
+            logger.info(f"💾 Retrain trigger written to {self.trigger_file}")
+
+        return report
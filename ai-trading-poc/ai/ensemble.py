@@ -0,0 +1,218 @@
+"""
+アンサンブル推論 - セッション/ホライズン/通貨ペア別モデルをまとめてバッチ推論
+"""
+
+import os
+import hashlib
+import logging
+import yaml
+import pandas as pd
+import numpy as np
+from dotenv import load_dotenv
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# market_session が無い行に割り当てるセッション値
+NO_SESSION = -1
+
+
+class EnsembleEngine:
+    """
+    複数モデルを一度だけ読み込み，入力行をルーティング先モデルごとに
+    まとめて1回のベクトル化呼び出しで推論するエンジン
+
+    ``predict(X)`` は単一 LightGBM Booster と同じ (n_rows, num_class) の
+    確率行列を返すので，PredictionEngine.model としてそのまま使える。
+    """
+
+    def __init__(self, config_path='config.yaml'):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        ensemble_config = self.config.get('ensemble', {})
+
+        self.combine = ensemble_config.get('combine', 'weighted')
+        if self.combine not in ('weighted', 'gating'):
+            raise ValueError(f"Unknown ensemble combine mode: {self.combine}")
+
+        self.default_symbol = self.config['data']['symbol']
+        # 使用する予測ホライズン（分）。horizon が異なるメンバーは読み込まない
+        self.horizon = ensemble_config.get('horizon')
+        self.num_class = self.config['model']['lgb_params']['num_class']
+        self.model_specs = ensemble_config.get('models', [])
+
+        self.models = []
+        self.feature_names = []
+        self.symbols = []
+        self.routes = {}
+        self.version = None
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def load_models(self):
+        """
+        設定された全モデルを読み込み，ルーティング表を構築
+
+        Returns:
+            bool: 1つ以上のモデルを読み込めたか
+        """
+        import train_model
+
+        self.models = []
+        self.feature_names = []
+        loaded_specs = []
+        digest = hashlib.sha256(self.combine.encode('utf-8'))
+        digest.update(str(self.horizon).encode('utf-8'))
+
+        for spec in self.model_specs:
+            spec_horizon = spec.get('horizon')
+            if self.horizon is not None and spec_horizon is not None and spec_horizon != self.horizon:
+                continue
+
+            model = train_model.ModelTrainer.load_model(spec['path'])
+            if model is None:
+                logger.warning(f"Skipping ensemble member: {spec.get('name', spec['path'])}")
+                continue
+
+            self.models.append(model)
+            self.feature_names.append(list(model.feature_name()))
+            loaded_specs.append(spec)
+            digest.update(train_model.ModelTrainer.model_version(spec['path']).encode('utf-8'))
+            digest.update(str(spec.get('weight', 1.0)).encode('utf-8'))
+
+        self._build_routes(loaded_specs)
+        # メンバー構成と重みから決まるアンサンブル全体のバージョン
+        self.version = digest.hexdigest()[:12]
+
+        logger.info(
+            f"✅ Ensemble loaded: {len(self.models)} models, "
+            f"{len(self.routes)} routes ({self.combine}, horizon {self.horizon})"
+        )
+        return len(self.models) > 0
+
+    def _build_routes(self, specs):
+        """
+        (symbol, session) ごとに使用するモデルと重みを事前計算
+
+        推論時はキーの参照だけで済むため，リクエストごとの処理量は
+        登録モデル数ではなく実際にヒットしたキー数にのみ比例する。
+        """
+        self.symbols = sorted(
+            {spec.get('symbol') or self.default_symbol for spec in specs}
+        )
+        sessions = sorted(
+            {spec['session'] for spec in specs if spec.get('session') is not None}
+        ) + [NO_SESSION]
+
+        self.routes = {}
+        for symbol in self.symbols:
+            for session in sessions:
+                candidates = []
+                for idx, spec in enumerate(specs):
+                    if (spec.get('symbol') or self.default_symbol) != symbol:
+                        continue
+                    spec_session = spec.get('session')
+                    if spec_session is not None and spec_session != session:
+                        continue
+                    # セッション指定ありのモデルほど具体的
+                    specificity = 0 if spec_session is None else 1
+                    candidates.append((idx, float(spec.get('weight', 1.0)), specificity))
+
+                if not candidates:
+                    continue
+
+                if self.combine == 'gating':
+                    # 最も具体的なモデルのみ使用（同順位は重みが大きい方）
+                    best = max(candidates, key=lambda c: (c[2], c[1]))
+                    candidates = [(best[0], 1.0, best[2])]
+
+                model_idx = np.array([c[0] for c in candidates], dtype=int)
+                weights = np.array([c[1] for c in candidates], dtype=float)
+                total = weights.sum()
+                if total <= 0:
+                    continue
+
+                self.routes[(symbol, session)] = (model_idx, weights / total)
+
+    def _row_keys(self, X, symbols):
+        """各行のルーティングキーを整数コードで返す"""
+        n_rows = len(X)
+
+        if symbols is None:
+            symbols = self.default_symbol
+        if isinstance(symbols, str):
+            symbol_values = np.full(n_rows, symbols, dtype=object)
+        else:
+            symbol_values = np.asarray(symbols, dtype=object)
+
+        if 'market_session' in X.columns:
+            sessions = X['market_session'].fillna(NO_SESSION).to_numpy(dtype=int)
+        else:
+            sessions = np.full(n_rows, NO_SESSION, dtype=int)
+
+        key_frame = pd.DataFrame({'symbol': symbol_values, 'session': sessions})
+        codes, uniques = pd.MultiIndex.from_frame(key_frame).factorize()
+        return codes, list(uniques)
+
+    def predict(self, X, symbols=None, num_threads=None):
+        """
+        ルーティングした各モデルの確率を結合して返す
+
+        Args:
+            X (pd.DataFrame): 特徴量データ
+            symbols (str | array-like): 行ごとの通貨ペア（省略時は設定値）
+            num_threads (int): 各モデルの推論スレッド数（省略時は LightGBM の既定）
+
+        Returns:
+            np.ndarray: (n_rows, num_class) のクラス確率
+        """
+        n_rows = len(X)
+        proba = np.zeros((n_rows, self.num_class))
+        if n_rows == 0 or not self.models:
+            return proba
+
+        codes, keys = self._row_keys(X, symbols)
+
+        # モデルごとに担当行と重みを集約
+        member_rows = {}
+        for code, key in enumerate(keys):
+            route = self.routes.get(key)
+            if route is None:
+                # セッション別モデルが無ければセッション共通モデルへフォールバック
+                route = self.routes.get((key[0], NO_SESSION))
+            if route is None:
+                continue
+
+            rows = np.flatnonzero(codes == code)
+            for model_idx, weight in zip(*route):
+                member_rows.setdefault(model_idx, []).append((rows, weight))
+
+        predict_params = {} if num_threads is None else {'num_threads': num_threads}
+        covered = np.zeros(n_rows, dtype=bool)
+        for model_idx, assignments in member_rows.items():
+            rows = np.concatenate([r for r, _ in assignments])
+            weights = np.concatenate([np.full(len(r), w) for r, w in assignments])
+
+            # 1モデルにつき1回だけ推論
+            X_member = X.iloc[rows][self.feature_names[model_idx]]
+            member_proba = self.models[model_idx].predict(X_member, **predict_params)
+
+            proba[rows] += member_proba * weights[:, None]
+            covered[rows] = True
+
+        if not covered.all():
+            logger.warning(f"{int((~covered).sum())} rows had no routed model")
+            proba[~covered] = np.nan
+
+        return proba
@@ -0,0 +1,255 @@
+"""
+シグナル説明 - LightGBM の木の寄与度 (pred_contrib) をバッチ計算してキャッシュ
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+import tempfile
+from collections import OrderedDict
+import yaml
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from dotenv import load_dotenv
+
+import lightgbm as lgb
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BIAS = '__bias__'
+
+
+class SignalExplainer:
+    """
+    シグナルごとの特徴量寄与度を計算するクラス
+
+    寄与度は (モデルバージョン, 足の時刻) をキーにメモリ(LRU)とディスクに
+    キャッシュし，未計算の行だけをまとめて1回の pred_contrib 呼び出しで求める。
+    """
+
+    def __init__(self, config_path='config.yaml', symbol=None):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        explain_config = self.config['explain']
+
+        self.symbol = symbol or self.config['data']['symbol']
+        self.top_k = explain_config['top_k']
+        self.cache_path = Path(explain_config['cache_path'])
+        self.memory_cache_size = explain_config['memory_cache_size']
+        self.class_map = self.config['prediction']['classes']
+        self.num_class = self.config['model']['lgb_params']['num_class']
+
+        self._memory = OrderedDict()
+        self._feature_names = {}
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def _partition_file(self, model_version, date):
+        """ディスクキャッシュのファイル"""
+        return (
+            self.cache_path / f"symbol={self.symbol}" /
+            f"model={model_version}" / f"date={date:%Y-%m-%d}.parquet"
+        )
+
+    def _recall(self, key):
+        """メモリキャッシュから取得（ヒットしたものは最近使った扱いにする）"""
+        contrib = self._memory.get(key)
+        if contrib is not None:
+            self._memory.move_to_end(key)
+        return contrib
+
+    def _remember(self, key, contrib):
+        """メモリキャッシュに登録（上限を超えたら古いものから削除）"""
+        self._memory[key] = contrib
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_cache_size:
+            self._memory.popitem(last=False)
+
+    def _load_from_disk(self, model_version, timestamps):
+        """
+        必要な日付のパーティションだけを読み込む
+
+        Returns:
+            dict: 足の時刻 -> 寄与度（メモリキャッシュにも登録）
+        """
+        wanted = set(timestamps)
+        loaded = {}
+        for date in sorted({ts.normalize() for ts in wanted}):
+            partition = self._partition_file(model_version, date)
+            if not partition.exists():
+                continue
+
+            frame = pd.read_parquet(partition)
+            frame = frame[frame['timestamp'].isin(wanted)]
+            columns = [col for col in frame.columns if col != 'timestamp']
+            if model_version not in self._feature_names:
+                per_class = len(columns) // self.num_class
+                self._feature_names[model_version] = [
+                    col.split(':', 1)[1] for col in columns[:per_class]
+                ]
+
+            values = frame[columns].to_numpy(dtype=np.float32)
+            for ts, row in zip(frame['timestamp'], values):
+                contrib = row.reshape(self.num_class, -1)
+                loaded[ts] = contrib
+                self._remember((model_version, ts), contrib)
+
+        return loaded
+
+    def _save_to_disk(self, model_version, timestamps, contribs, feature_names):
+        """新しく計算した寄与度を日付パーティションに追記"""
+        columns = [
+            f"{cls}:{name}" for cls in range(self.num_class) for name in feature_names
+        ]
+        frame = pd.DataFrame(contribs.reshape(len(timestamps), -1), columns=columns)
+        frame.insert(0, 'timestamp', timestamps)
+
+        for date, rows in frame.groupby(frame['timestamp'].dt.normalize()):
+            partition = self._partition_file(model_version, date)
+            partition.parent.mkdir(parents=True, exist_ok=True)
+            if partition.exists():
+                rows = pd.concat([pd.read_parquet(partition), rows], ignore_index=True)
+
+            rows = rows.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+            # 同時に動く predict.py と一時ファイルが衝突しないようプロセスごとに別名
+            with tempfile.NamedTemporaryFile(
+                dir=partition.parent, prefix=f"{partition.stem}.", suffix='.tmp', delete=False
+            ) as tmp:
+                tmp_file = tmp.name
+            try:
+                rows.to_parquet(tmp_file, index=False)
+                os.replace(tmp_file, partition)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+
+    def contributions(self, model, model_version, X):
+        """
+        各行の寄与度を返す（キャッシュ優先，未計算分はバッチ計算）
+
+        Args:
+            model (lgb.Booster): 学習済みモデル
+            model_version (str): モデルバージョン
+            X (pd.DataFrame): モデル入力（インデックスは足の時刻）
+
+        Returns:
+            np.ndarray: (n_rows, num_class, n_features + 1)，最後の列はバイアス
+        """
+        timestamps = list(pd.DatetimeIndex(X.index))
+        found = {}
+        for i, ts in enumerate(timestamps):
+            contrib = self._recall((model_version, ts))
+            if contrib is not None:
+                found[i] = contrib
+
+        missing = [i for i in range(len(timestamps)) if i not in found]
+        if missing:
+            loaded = self._load_from_disk(model_version, [timestamps[i] for i in missing])
+            for i in missing:
+                if timestamps[i] in loaded:
+                    found[i] = loaded[timestamps[i]]
+            missing = [i for i in missing if i not in found]
+
+        if missing:
+            feature_names = list(model.feature_name())
+            X_missing = X.iloc[missing][feature_names]
+
+            # 1回の呼び出しで未計算の全行を処理
+            raw = model.predict(X_missing, pred_contrib=True)
+            contribs = np.asarray(raw, dtype=np.float32).reshape(
+                len(missing), self.num_class, len(feature_names) + 1
+            )
+
+            self._feature_names[model_version] = feature_names + [BIAS]
+            for i, contrib in zip(missing, contribs):
+                found[i] = contrib
+                self._remember((model_version, timestamps[i]), contrib)
+            self._save_to_disk(
+                model_version, [timestamps[i] for i in missing],
+                contribs, feature_names + [BIAS]
+            )
+            logger.info(f"🧮 Computed contributions for {len(missing)} rows")
+
+        return np.stack([found[i] for i in range(len(timestamps))])
+
+    def _format(self, model_version, timestamp, contrib):
+        """寄与度を予測クラスの上位 top_k 特徴量に整形"""
+        names = self._feature_names[model_version]
+        raw_scores = contrib.sum(axis=1)
+        pred_class = int(np.argmax(raw_scores))
+        class_contrib = contrib[pred_class]
+
+        order = np.argsort(-np.abs(class_contrib[:-1]))[:self.top_k]
+        return {
+            'model_version': model_version,
+            'bar_timestamp': timestamp.isoformat(),
+            'signal': self.class_map.get(pred_class, 'UNKNOWN'),
+            'base_value': float(class_contrib[-1]),
+            'top_features': [
+                {'feature': names[i], 'contribution': float(class_contrib[i])}
+                for i in order
+            ],
+        }
+
+    def explain_batch(self, model, model_version, X):
+        """
+        各行の説明を返す
+
+        Returns:
+            list: 行ごとの説明（寄与度を計算できないモデルでは None）
+        """
+        if not isinstance(model, lgb.Booster):
+            logger.warning("Explanations are only available for a single LightGBM model")
+            return [None] * len(X)
+
+        contribs = self.contributions(model, model_version, X)
+        return [
+            self._format(model_version, ts, contrib)
+            for ts, contrib in zip(pd.DatetimeIndex(X.index), contribs)
+        ]
+
+    def lookup(self, model_version, timestamp):
+        """キャッシュ済みの説明を取得（未計算なら None）"""
+        timestamp = pd.Timestamp(timestamp)
+        contrib = self._recall((model_version, timestamp))
+        if contrib is None:
+            contrib = self._load_from_disk(model_version, [timestamp]).get(timestamp)
+        if contrib is None:
+            return None
+        return self._format(model_version, timestamp, contrib)
+
+def main():
+    """メイン処理（キャッシュ済みの説明をJSONで出力）"""
+    parser = argparse.ArgumentParser(description='Look up a cached signal explanation')
+    parser.add_argument('--timestamp', required=True, help='足の時刻')
+    parser.add_argument('--model-version', required=True)
+    parser.add_argument('--symbol')
+    args = parser.parse_args()
+
+    explainer = SignalExplainer('config.yaml', symbol=args.symbol)
+    explanation = explainer.lookup(args.model_version, args.timestamp)
+    if explanation is None:
+        logger.error("❌ Explanation not found (run signal_store.py backfill to compute)")
+        sys.exit(1)
+
+    print(json.dumps(explanation, ensure_ascii=False))
+    return explanation
+
+
+if __name__ == '__main__':
+    main()
@@ -22,13 +22,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 教師ラベルのフォワードリターンの期間（分）
+TARGET_HORIZON = 60
+
+# 特徴量生成時のメモリ倍率（特徴量フレーム + 中間Series + 最後の dropna コピー）
+FEATURE_COPY_FACTOR = 3
+
 
 class FeatureEngineer:
     """特徴量生成クラス"""
     
     def __init__(self, config_path='config.yaml'):
         """初期化"""
+        import memory_tracker
+        
+        self.config_path = config_path
         self.config = self._load_config(config_path)
+        self.memory = memory_tracker.MemoryTracker(config_path)
         self.features_path = Path(self.config['data']['features_path'])
         self.features_path.mkdir(parents=True, exist_ok=True)
     
@@ -38,12 +48,19 @@ class FeatureEngineer:
         with open(config_path, 'r', encoding='utf-8') as f:
             return yaml.safe_load(f)
     
-    def engineer_features(self, df):
+    def engineer_features(self, df, include_target=True, basket=None, cross_features=None):
         """
         OHLCV データから特徴量を生成
         
+        見積もりメモリが features の予算を超える場合は行をチャンクに分けて生成する。
+        
         Args:
             df (pd.DataFrame): OHLCV データ
+            include_target (bool): 教師ラベル (target, target_return) を生成するか
+            basket (pd.DataFrame): クロスアセット用のバスケット終値（列 = 通貨ペア）
+                cross_asset.enabled で省略時は保存済みデータを読み込む
+            cross_features (pd.DataFrame): 計算済みのクロスアセット特徴量（df と同じ時刻）
+                ライブ更新のように逐次計算している場合に渡すと再計算しない
         
         Returns:
             pd.DataFrame: 特徴量データ
@@ -52,6 +69,85 @@ class FeatureEngineer:
             logger.error("Empty dataframe")
             return None
         
+        with self.memory.stage('features'):
+            bytes_per_row = self._feature_row_bytes(df)
+            if self.memory.fits('features', len(df) * bytes_per_row):
+                return self._build_features(df, include_target, basket, cross_features)
+            return self._build_features_in_chunks(
+                df, include_target, basket, cross_features, bytes_per_row
+            )
+    
+    def _feature_row_bytes(self, df):
+        """1行あたりの特徴量生成メモリの見積もり"""
+        features_config = self.config['features']
+        n_columns = (
+            len(df.columns) +
+            len(features_config['returns']) +
+            len(features_config['sma_deviation']) +
+            len(features_config['atr_periods']) +
+            # rsi, 時間帯, 曜日, ラベル
+            1 + 2 + 2 + 2
+        )
+        if self.config.get('cross_asset', {}).get('enabled', False):
+            n_columns += 3 * len(self.config['cross_asset']['symbols'])
+        
+        return n_columns * 8 * FEATURE_COPY_FACTOR
+    
+    def _lookback(self):
+        """特徴量計算に必要な過去データの本数"""
+        return max(self.config['features']['returns'] + 
+                   self.config['features']['sma_deviation'] +
+                   self.config['features']['atr_periods'])
+    
+    def _build_features_in_chunks(self, df, include_target, basket, cross_features,
+                                  bytes_per_row):
+        """
+        予算に収まる行数ずつ特徴量を生成
+        
+        各チャンクの前後にローリング計算とラベルに必要な行を重ねて計算し，
+        重ねた部分を捨てて結合するため，一括で生成した場合と同じ結果になる。
+        """
+        cross_enabled = self.config.get('cross_asset', {}).get('enabled', False)
+        
+        overlap_before = self._lookback()
+        if cross_enabled:
+            overlap_before = max(overlap_before, self.config['cross_asset']['window'])
+        overlap_before += 1
+        overlap_after = TARGET_HORIZON if include_target else 0
+        
+        rows = (
+            self.memory.chunk_rows('features', bytes_per_row) -
+            overlap_before - overlap_after
+        )
+        if rows < overlap_before:
+            # 重なりの方が大きくなる予算では分割しても収まらない
+            self.memory.require(
+                'features', len(df) * bytes_per_row,
+                detail=f"too small to split with a {overlap_before + overlap_after}-row overlap"
+            )
+        
+        if cross_enabled and basket is None and cross_features is None:
+            import cross_asset
+            basket = cross_asset.load_basket_closes(self.config_path)
+        
+        logger.info(f"🔧 Engineering features in chunks of {rows} rows (memory budget)")
+        
+        parts = []
+        for start in range(0, len(df), rows):
+            end = min(start + rows, len(df))
+            chunk = df.iloc[max(start - overlap_before, 0):end + overlap_after]
+            part = self._build_features(chunk, include_target, basket, cross_features)
+            if part is None:
+                return None
+            
+            # 担当範囲の行だけを残す
+            first, last = df.index[start], df.index[end - 1]
+            parts.append(part[(part.index >= first) & (part.index <= last)])
+        
+        return pd.concat(parts)
+    
+    def _build_features(self, df, include_target, basket, cross_features=None):
+        """特徴量を一括で生成"""
         logger.info("🔧 Engineering features...")
         
         features = df.copy()
@@ -104,32 +200,40 @@ class FeatureEngineer:
             features['day_of_week'] = features.index.dayofweek
             features['is_weekend'] = (features['day_of_week'] >= 5).astype(int)
         
+        # ===== クロスアセット特徴量 =====
+        if self.config.get('cross_asset', {}).get('enabled', False):
+            if cross_features is None:
+                cross_features = self._cross_asset_features(df, basket)
+                if cross_features is None:
+                    return None
+            features = features.join(cross_features)
+        
         # ===== フォワードリターン（教師ラベル用）=====
-        # 1時間後（60分後）のリターンを計算
-        forward_return = (
-            df['close'].shift(-60) - df['close']
-        ) / df['close'] * 100
-        
-        features['target_return'] = forward_return
-        
-        # =====3クラスラベル生成 =====
-        def classify_trend(ret):
-            if pd.isna(ret):
-                return np.nan
-            elif ret > 0.1:  # 0.1%以上の上昇
-                return 1  # LONG
-            elif ret < -0.1:  # 0.1%以上の下落
-                return 0  # SHORT
-            else:
-                return 2  # NO_TRADE
-        
-        features['target'] = features['target_return'].apply(classify_trend)
+        # 推論用（include_target=False）は将来データが無い直近行を残すため生成しない
+        if include_target:
+            # 1時間後（60分後）のリターンを計算
+            forward_return = (
+                df['close'].shift(-TARGET_HORIZON) - df['close']
+            ) / df['close'] * 100
+            
+            features['target_return'] = forward_return
+            
+            # =====3クラスラベル生成 =====
+            def classify_trend(ret):
+                if pd.isna(ret):
+                    return np.nan
+                elif ret > 0.1:  # 0.1%以上の上昇
+                    return 1  # LONG
+                elif ret < -0.1:  # 0.1%以上の下落
+                    return 0  # SHORT
+                else:
+                    return 2  # NO_TRADE
+            
+            features['target'] = features['target_return'].apply(classify_trend)
         
         # ===== NaNを削除 =====
         # 特徴量計算に必要な過去データの分だけ削除
-        lookback = max(self.config['features']['returns'] + 
-                      self.config['features']['sma_deviation'] +
-                      self.config['features']['atr_periods'])
+        lookback = self._lookback()
         
         features = features.iloc[lookback:].dropna()
         
@@ -139,6 +243,20 @@ class FeatureEngineer:
         
         return features
     
+    def _cross_asset_features(self, df, basket):
+        """バスケット各ペアとのローリング相関/ベータ/スプレッドZスコア"""
+        import cross_asset
+        
+        if basket is None:
+            basket = cross_asset.load_basket_closes(self.config_path)
+        
+        missing = [s for s in self.config['cross_asset']['symbols'] if s not in basket.columns]
+        if missing:
+            logger.error(f"Missing basket data for: {', '.join(missing)}")
+            return None
+        
+        return cross_asset.CrossAssetFeatures(self.config_path).transform(df['close'], basket)
+    
     @staticmethod
     def _calculate_atr(df, period):
         """ATR（Average True Range）を計算"""
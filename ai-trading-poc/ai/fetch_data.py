@@ -24,12 +24,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# CSVテキストに対する読み込み時のメモリ倍率（パーサのバッファ + DataFrame）
+CSV_PARSE_FACTOR = 2
+
 class DataFetcher:
     """Alpha Vantage APIからデータを取得するクラス"""
     
     def __init__(self, config_path='config.yaml'):
         """初期化"""
+        import memory_tracker
+        
         self.config = self._load_config(config_path)
+        self.memory = memory_tracker.MemoryTracker(config_path)
         self.api_key = os.getenv('ALPHA_VANTAGE_KEY', 'demo')
         self.base_url = self.config['api']['base_url']
         self.timeout = self.config['api']['timeout']
@@ -188,14 +194,39 @@ class DataFetcher:
         latest_file = csv_files[-1]
         logger.info(f"Loading from {latest_file}")
         
-        df = pd.read_csv(latest_file, index_col=0, parse_dates=True)
-        
-        # 過去Nデー分を返す
         cutoff_date = datetime.now() - timedelta(days=days)
-        df = df[df.index >= cutoff_date]
+        estimated = latest_file.stat().st_size * CSV_PARSE_FACTOR
+        
+        with self.memory.stage('load_csv'):
+            if self.memory.fits('load_csv', estimated):
+                df = pd.read_csv(latest_file, index_col=0, parse_dates=True)
+                
+                # 過去Nデー分を返す
+                df = df[df.index >= cutoff_date]
+            else:
+                df = self._read_csv_in_chunks(latest_file, cutoff_date)
         
         logger.info(f"✅ Loaded {len(df)} records from {latest_file}")
         return df
+    
+    def _read_csv_in_chunks(self, csv_file, cutoff_date):
+        """予算に収まる行数ずつ読み込み，期間外の行はチャンクごとに捨てる"""
+        # 先頭付近の行長から1行あたりのメモリを見積もる
+        with open(csv_file, 'r', encoding='utf-8') as f:
+            sample = f.readlines(64 * 1024)[1:]
+        line_bytes = sum(len(line) for line in sample) / max(len(sample), 1)
+        rows = self.memory.chunk_rows('load_csv', line_bytes * CSV_PARSE_FACTOR)
+        logger.info(f"   Reading in chunks of {rows} rows (memory budget)")
+        
+        kept = []
+        for chunk in pd.read_csv(csv_file, index_col=0, parse_dates=True, chunksize=rows):
+            chunk = chunk[chunk.index >= cutoff_date]
+            if len(chunk) > 0:
+                kept.append(chunk)
+        
+        if not kept:
+            return pd.read_csv(csv_file, index_col=0, parse_dates=True, nrows=0)
+        return pd.concat(kept)
 
 
 def main():
@@ -0,0 +1,232 @@
+"""
+メモリ計測 - ステージごとのピーク割り当て/RSSを記録し，メモリ予算を判定
+"""
+
+import os
+import sys
+import time
+import logging
+import tracemalloc
+from contextlib import contextmanager
+import yaml
+import psutil
+from dotenv import load_dotenv
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# 実行中のステージ（tracemalloc のピークはプロセス全体で1つなので入れ子を自前で管理）
+_active_stages = []
+_started_tracing = False
+# enable_tracing() を呼んだプロセス（学習/バッチ）だけ割り当てを計測する
+_tracing_enabled = False
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """ステージがメモリ予算内で処理できない（分割もできない）場合の例外"""
+
+
+def enable_tracing():
+    """
+    このプロセスのステージで tracemalloc による割り当て計測を有効にする
+
+    tracemalloc は全ての割り当てを遅くするため，パイプライン/バッチの
+    エントリポイントからのみ呼ぶ（サービング経路では予算判定だけ行う）。
+    """
+    global _tracing_enabled
+    _tracing_enabled = True
+
+
+def current_rss_mb():
+    """現在のRSS"""
+    return psutil.Process().memory_info().rss / MB
+
+
+def max_rss_mb():
+    """プロセス開始以降のピークRSS（resource が無い場合は None）"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB, macOS は bytes
+    return max_rss / (MB if sys.platform == 'darwin' else 1024)
+
+
+class _StageFrame:
+    """実行中ステージの計測状態"""
+
+    def __init__(self, name):
+        self.name = name
+        self.start_traced = 0
+        self.peak_traced = 0
+
+
+class MemoryTracker:
+    """
+    ステージ単位のメモリ計測と予算判定
+
+    stage() で囲んだ区間のピーク割り当て（tracemalloc）とRSSを記録する。
+    予算は見積もりバイト数で事前に判定し，呼び出し側は fits() / chunk_rows()
+    で分割処理に切り替えるか，require() で即時に失敗させる。
+    割り当ての計測は trace_allocations か enable_tracing() で有効な場合のみ。
+    """
+
+    def __init__(self, config_path='config.yaml'):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        memory_config = self.config['memory']
+
+        self.trace_allocations = memory_config.get('trace_allocations', False)
+        self.budgets = memory_config.get('budgets_mb') or {}
+        self.records = {}
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def budget_bytes(self, stage):
+        """ステージの予算（バイト，未設定なら None）"""
+        budget_mb = self.budgets.get(stage)
+        if budget_mb is None:
+            return None
+        return int(budget_mb * MB)
+
+    def fits(self, stage, estimated_bytes):
+        """見積もりが予算内か"""
+        budget = self.budget_bytes(stage)
+        return budget is None or estimated_bytes <= budget
+
+    def chunk_rows(self, stage, bytes_per_row):
+        """
+        予算内に収まる1チャンクあたりの行数
+
+        Returns:
+            int: 行数（予算未設定なら None）
+        """
+        budget = self.budget_bytes(stage)
+        if budget is None:
+            return None
+        return max(int(budget // max(bytes_per_row, 1)), 1)
+
+    def require(self, stage, estimated_bytes, detail=''):
+        """
+        見積もりが予算を超える場合は分割せずに即時失敗
+
+        Raises:
+            MemoryBudgetExceeded: 予算超過
+        """
+        if self.fits(stage, estimated_bytes):
+            return
+
+        message = (
+            f"Stage '{stage}' needs ~{estimated_bytes / MB:.1f}MB "
+            f"but its budget is {self.budgets[stage]}MB"
+            + (f" ({detail})" if detail else "")
+            + f". Measured so far: {self.summary()}"
+        )
+        logger.error(f"❌ {message}")
+        raise MemoryBudgetExceeded(message)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        区間のメモリを計測して records[name] に記録
+
+        Yields:
+            dict: 記録（区間終了時に値が入る）
+        """
+        global _started_tracing
+
+        record = {}
+        tracing = self.trace_allocations or _tracing_enabled
+        if tracing and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+
+        frame = _StageFrame(name)
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # 外側のステージのピークを確定してからリセット
+            if _active_stages:
+                outer = _active_stages[-1]
+                outer.peak_traced = max(outer.peak_traced, peak)
+            tracemalloc.reset_peak()
+            frame.start_traced = current
+            frame.peak_traced = current
+        _active_stages.append(frame)
+
+        rss_start = current_rss_mb()
+        max_rss_start = max_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            if tracemalloc.is_tracing():
+                frame.peak_traced = max(frame.peak_traced, tracemalloc.get_traced_memory()[1])
+            _active_stages.pop()
+            if _active_stages:
+                outer = _active_stages[-1]
+                outer.peak_traced = max(outer.peak_traced, frame.peak_traced)
+            elif _started_tracing:
+                tracemalloc.stop()
+                _started_tracing = False
+
+            max_rss_end = max_rss_mb()
+            rss_end = current_rss_mb()
+            record.update({
+                'seconds': round(time.perf_counter() - start, 4),
+                'peak_alloc_mb': (
+                    round((frame.peak_traced - frame.start_traced) / MB, 2)
+                    if tracing else None
+                ),
+                'rss_start_mb': round(rss_start, 2),
+                'rss_end_mb': round(rss_end, 2),
+                'max_rss_mb': round(max_rss_end, 2) if max_rss_end is not None else None,
+                # このステージがプロセスのピークRSSをどれだけ押し上げたか
+                'max_rss_growth_mb': (
+                    round(max_rss_end - max_rss_start, 2)
+                    if max_rss_end is not None else None
+                ),
+                'budget_mb': self.budgets.get(name),
+            })
+            self.records[name] = record
+            self._log(name, record)
+
+    def _log(self, name, record):
+        """
+        計測結果をログ出力
+
+        予算超過のみ警告し，それ以外は DEBUG（サービング経路では足ごとに
+        呼ばれるため INFO には出さない。値は records / マニフェストに残る）
+        """
+        peak = record['peak_alloc_mb']
+        budget = record['budget_mb']
+        text = (
+            f"{name}: peak alloc {peak}MB, max RSS {record['max_rss_mb']}MB"
+            + (f" (budget {budget}MB)" if budget is not None else "")
+        )
+        if budget is not None and peak is not None and peak > budget:
+            logger.warning(f"⚠️  {text} - exceeded budget, estimate was too low")
+        else:
+            logger.debug(f"🧠 {text}")
+
+    def summary(self):
+        """記録済みステージの peak alloc を1行に要約"""
+        return ', '.join(
+            f"{name}={record['peak_alloc_mb']}MB" for name, record in self.records.items()
+        ) or 'none'
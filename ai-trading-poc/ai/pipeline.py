@@ -0,0 +1,354 @@
+"""
+学習パイプライン - 取得/特徴量/学習/評価/保存を1プロセス内のDAGとして実行
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timedelta
+import yaml
+import pandas as pd
+from pathlib import Path
+from dotenv import load_dotenv
+
+import fetch_data
+import feature_engineer
+import train_model
+import cross_asset
+import resources
+import memory_tracker
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 標準出力に書く進捗行の接頭辞（バックエンドのジョブキューが解析する）
+PROGRESS_PREFIX = 'PIPELINE_PROGRESS '
+
+
+def fingerprint_frame(df):
+    """DataFrameの内容（インデックス含む）からハッシュを計算"""
+    hashed = pd.util.hash_pandas_object(df, index=True).values
+    digest = hashlib.sha256(hashed.tobytes())
+    digest.update(','.join(map(str, df.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Stage:
+    """パイプラインの1ステージ"""
+
+    def __init__(self, name, deps, run, restore=None, config_keys=(), fingerprint=None):
+        """
+        Args:
+            name (str): ステージ名
+            deps (list): 依存するステージ名
+            run (callable): run(inputs) -> 出力
+            restore (callable): restore(entry) -> 前回の出力（復元できなければNone）
+            config_keys (tuple): 結果に影響する config のセクション
+            fingerprint (callable): fingerprint() -> 依存ステージ以外の入力のハッシュ
+        """
+        self.name = name
+        self.deps = list(deps)
+        self.run = run
+        self.restore = restore
+        self.config_keys = config_keys
+        self.fingerprint = fingerprint
+
+
+class TrainingPipeline:
+    """学習パイプラインを1プロセスで実行するオーケストレーター"""
+
+    def __init__(self, config_path='config.yaml', symbol='USDJPY'):
+        """初期化"""
+        self.config_path = config_path
+        self.config = self._load_config(config_path)
+        self.symbol = symbol
+        self.pipeline_config = self.config['pipeline']
+
+        # 各クラスは同じ config を共有（stage ごとの再読み込みは不要）
+        self.fetcher = fetch_data.DataFetcher(config_path)
+        self.engineer = feature_engineer.FeatureEngineer(config_path)
+        self.trainer = train_model.ModelTrainer(config_path)
+        self.memory = memory_tracker.MemoryTracker(config_path)
+
+        self.manifest_file = (
+            Path(self.config['model']['model_path']) /
+            self.pipeline_config['manifest_filename']
+        )
+        self.manifest = self._load_manifest()
+        self.timings = {}
+        self._split = None
+        self._basket = None
+
+        self.stages = [
+            Stage('fetch', [], self._run_fetch),
+            Stage('features', ['fetch'], self._run_features,
+                  restore=self._restore_features,
+                  config_keys=('features', 'cross_asset'),
+                  fingerprint=self._fingerprint_basket),
+            Stage('train', ['features'], self._run_train,
+                  restore=self._restore_model,
+                  config_keys=('model',)),
+            Stage('evaluate', ['features', 'train'], self._run_evaluate,
+                  restore=self._restore_metrics),
+            Stage('save', ['features', 'train'], self._run_save,
+                  restore=self._restore_model,
+                  config_keys=('drift',)),
+        ]
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def _load_manifest(self):
+        """前回実行時のステージ情報を読み込む"""
+        if not self.manifest_file.exists():
+            return {}
+
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('stages', {})
+
+    def _save_manifest(self):
+        """ステージ情報とタイミングを保存"""
+        with open(self.manifest_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'updated_at': datetime.now().isoformat() + 'Z',
+                'stages': self.manifest,
+                'timings': self.timings,
+                # 各クラス内の処理単位の計測（ワーカーのメモリ見積もり用）
+                'memory': {
+                    'fetch': self.fetcher.memory.records,
+                    'features': self.engineer.memory.records,
+                    'train': self.trainer.memory.records,
+                },
+            }, f, indent=2, ensure_ascii=False)
+
+    def _stage_key(self, stage, dep_keys):
+        """入力（依存ステージのキー + 関連config）から一意なキーを作る"""
+        digest = hashlib.sha256(stage.name.encode('utf-8'))
+        for key in dep_keys:
+            digest.update(key.encode('utf-8'))
+        for section in stage.config_keys:
+            digest.update(
+                json.dumps(self.config.get(section), sort_keys=True).encode('utf-8')
+            )
+        if stage.fingerprint is not None:
+            digest.update(stage.fingerprint().encode('utf-8'))
+        return digest.hexdigest()
+
+    # ===== ステージ実装 =====
+
+    def _run_fetch(self, inputs):
+        """データ取得（外部ソースなので常に実行）"""
+        if self.fetcher.api_key == 'demo':
+            logger.info("Using demo data (API key is 'demo')")
+            df = self.fetcher.fetch_demo_data(self.symbol, self.config['data']['interval'])
+        else:
+            df = self.fetcher.fetch_intraday(self.symbol, self.config['data']['interval'])
+
+        if df is None:
+            raise RuntimeError("Failed to fetch data")
+
+        if self.pipeline_config.get('persist_raw', False):
+            self.fetcher.save_data(df, self.symbol)
+
+        # 直近 train_days 日分を使用
+        cutoff_date = datetime.now() - timedelta(days=self.config['model']['train_days'])
+        return df[df.index >= cutoff_date]
+
+    def _fingerprint_basket(self):
+        """クロスアセットのバスケット終値を読み込んでハッシュ（無効なら空文字）"""
+        if not self.config.get('cross_asset', {}).get('enabled', False):
+            return ''
+
+        # 特徴量生成でも同じデータを使う（読み直さない）
+        self._basket = cross_asset.load_basket_closes(self.config_path)
+        return fingerprint_frame(self._basket)
+
+    def _run_features(self, inputs):
+        """特徴量生成"""
+        features = self.engineer.engineer_features(inputs['fetch'], basket=self._basket)
+        if features is None:
+            raise RuntimeError("Failed to engineer features")
+
+        entry = {}
+        if self.pipeline_config.get('persist_features', False):
+            entry['path'] = str(self.engineer.save_features(features, self.symbol))
+        return features, entry
+
+    def _restore_features(self, entry):
+        """保存済みの特徴量を読み込む"""
+        path = entry.get('path')
+        if not path or not os.path.exists(path):
+            return None
+        return pd.read_csv(path, index_col=0, parse_dates=True)
+
+    def _get_split(self, features):
+        """学習/テスト分割（1回の実行内で使い回す）"""
+        if self._split is None:
+            self._split = self.trainer.prepare_data(features)
+        return self._split
+
+    def _run_train(self, inputs):
+        """学習データを分割してモデルを学習"""
+        X_train, _, y_train, _ = self._get_split(inputs['features'])
+        self.trainer.train(X_train, y_train)
+        return self.trainer.model
+
+    def _restore_model(self, entry):
+        """保存済みモデルを読み込む"""
+        model_file = self.trainer.model_path / self.config['model']['model_filename']
+        if not model_file.exists():
+            return None
+
+        model = train_model.ModelTrainer.load_model(str(model_file))
+        self.trainer.model = model
+        return model
+
+    def _run_evaluate(self, inputs):
+        """テストデータで評価"""
+        _, X_test, _, y_test = self._get_split(inputs['features'])
+        metrics = self.trainer.evaluate(X_test, y_test)
+        summary = {'accuracy': metrics['accuracy']} if metrics else {}
+        return metrics, {'metrics': summary}
+
+    def _restore_metrics(self, entry):
+        """前回の評価結果を返す"""
+        return entry.get('metrics')
+
+    def _run_save(self, inputs):
+        """モデルと参照プロファイルを保存"""
+        model_file = self.trainer.save_model(self.symbol)
+        # 参照プロファイルは学習に使っていない検証データから作る
+        self.trainer.save_reference_profile(self._get_split(inputs['features'])[1])
+        return model_file
+
+    # ===== 実行 =====
+
+    def run(self, force=False):
+        """
+        DAGを依存順に実行
+
+        Args:
+            force (bool): 入力が変わっていなくても全ステージを実行
+
+        Returns:
+            dict: ステージ名 -> 出力
+        """
+        outputs = {}
+        keys = {}
+        self.timings = {}
+        self._split = None
+        self._basket = None
+
+        for index, stage in enumerate(self.stages):
+            self._report_progress(stage.name, index)
+            inputs = {dep: outputs[dep] for dep in stage.deps}
+            key = self._stage_key(stage, [keys[dep] for dep in stage.deps])
+            previous = self.manifest.get(stage.name, {})
+
+            start = time.perf_counter()
+            output = None
+            skipped = False
+
+            with self.memory.stage(f"pipeline.{stage.name}") as memory:
+                if not force and stage.restore is not None and previous.get('key') == key:
+                    output = stage.restore(previous)
+                    skipped = output is not None
+
+                entry = previous
+                if not skipped:
+                    result = stage.run(inputs)
+                    if isinstance(result, tuple):
+                        output, entry = result
+                    else:
+                        output, entry = result, {}
+
+            # fetch はデータそのものをキーにする（下流のスキップ判定に使用）
+            if stage.name == 'fetch':
+                key = fingerprint_frame(output)
+
+            elapsed = time.perf_counter() - start
+            self.timings[stage.name] = {
+                'seconds': round(elapsed, 4),
+                'skipped': skipped,
+                'peak_alloc_mb': memory['peak_alloc_mb'],
+                'max_rss_mb': memory['max_rss_mb'],
+            }
+            logger.info(
+                f"⏱️  {stage.name}: {elapsed:.3f}s"
+                + (f", peak alloc {memory['peak_alloc_mb']}MB"
+                   if memory['peak_alloc_mb'] is not None else "")
+                + (" (skipped)" if skipped else "")
+            )
+
+            outputs[stage.name] = output
+            keys[stage.name] = key
+            self.manifest[stage.name] = {**entry, 'key': key}
+            self._report_progress(stage.name, index + 1, skipped)
+
+        self._save_manifest()
+        return outputs
+
+    def _report_progress(self, stage_name, completed, skipped=False):
+        """
+        進捗を1行のJSONで標準出力に書く（ログは標準エラー出力）
+
+        Args:
+            stage_name (str): 実行中/完了したステージ
+            completed (int): 完了したステージ数
+            skipped (bool): ステージをスキップしたか
+        """
+        progress = {
+            'stage': stage_name,
+            'completed': completed,
+            'total': len(self.stages),
+            'skipped': skipped,
+        }
+        print(PROGRESS_PREFIX + json.dumps(progress), flush=True)
+
+
+def main():
+    """メイン処理"""
+    logger.info("=" * 50)
+    logger.info("🚀 In-process Training Pipeline")
+    logger.info("=" * 50)
+
+    force = '--force' in sys.argv
+    resources.ResourceBudget('config.yaml').apply('training')
+    memory_tracker.enable_tracing()
+
+    try:
+        pipeline = TrainingPipeline('config.yaml')
+        pipeline.run(force=force)
+    except Exception as e:
+        logger.error(f"❌ Pipeline failed: {e}")
+        return None
+
+    logger.info("\n📊 Stage Timings:")
+    for name, timing in pipeline.timings.items():
+        status = 'skipped' if timing['skipped'] else 'ran'
+        logger.info(
+            f"  {name}: {timing['seconds']:.3f}s ({status}), "
+            f"peak alloc {timing['peak_alloc_mb']}MB"
+        )
+
+    logger.info("\n✅ Training pipeline complete!")
+    return pipeline.timings
+
+
+if __name__ == '__main__':
+    # 失敗時は非ゼロ終了（バックエンドのジョブを失敗扱いにする）
+    if main() is None:
+        sys.exit(1)
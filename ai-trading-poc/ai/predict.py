@@ -5,6 +5,7 @@
 import os
 import sys
 import json
+import argparse
 import logging
 from datetime import datetime, timedelta
 import yaml
@@ -23,16 +24,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# predict_batch の結果1行（dict）あたりのメモリの見積もり
+RESULT_ROW_BYTES = 2048
+
 
 class PredictionEngine:
     """推論エンジン"""
     
     def __init__(self, config_path='config.yaml'):
         """初期化"""
+        import resources
+        import memory_tracker
+        
+        self.config_path = config_path
         self.config = self._load_config(config_path)
+        self.memory = memory_tracker.MemoryTracker(config_path)
         self.model = None
+        self.model_version = None
+        # アンサンブルは通貨ペア/セッションで行をルーティングする
+        self.routed = False
+        self.drift_monitor = None
+        self.explainer = None
         self.class_map = self.config['prediction']['classes']
         self.confidence_threshold = self.config['prediction']['confidence_threshold']
+        
+        # 単発推論はサービング，一括推論はバッチの予算で LightGBM のスレッド数を制限
+        budget = resources.ResourceBudget(config_path)
+        self.serving_threads = budget.threads('serving')
+        self.batch_threads = budget.threads('batch_scoring')
     
     @staticmethod
     def _load_config(config_path):
@@ -45,14 +64,47 @@ class PredictionEngine:
         import train_model
         
         self.model = train_model.ModelTrainer.load_model(model_path)
-        return self.model is not None
+        if self.model is None:
+            return False
+        
+        self.routed = False
+        self.model_version = train_model.ModelTrainer.model_version(model_path)
+        return True
+    
+    def load_ensemble(self):
+        """設定されたアンサンブルモデル群を読み込む"""
+        import ensemble
+        
+        engine = ensemble.EnsembleEngine(self.config_path)
+        if not engine.load_models():
+            return False
+        
+        self.model = engine
+        self.routed = True
+        self.model_version = engine.version
+        return True
     
-    def predict(self, features_df):
+    def attach_drift_monitor(self, monitor):
+        """推論ごとに入力と確率を流すドリフトモニターを登録"""
+        self.drift_monitor = monitor
+    
+    def attach_explainer(self, explainer):
+        """予測ごとに特徴量寄与度を付与する SignalExplainer を登録"""
+        self.explainer = explainer
+    
+    def _predict_proba(self, X, symbol, num_threads):
+        """クラス確率を計算（アンサンブルには通貨ペアを渡してルーティング）"""
+        if self.routed:
+            return self.model.predict(X, symbols=symbol, num_threads=num_threads)
+        return self.model.predict(X, num_threads=num_threads)
+    
+    def predict(self, features_df, symbol=None):
         """
         最新の特徴量から予測を実施
         
         Args:
             features_df (pd.DataFrame): 特徴量データ（最新1行）
+            symbol (str): 通貨ペア（アンサンブルのルーティング用，省略時は設定値）
         
         Returns:
             dict: 予測結果
@@ -75,10 +127,17 @@ class PredictionEngine:
         )
         
         # 予測
-        pred_proba = self.model.predict(X)
+        pred_proba = self._predict_proba(X, symbol, self.serving_threads)
+        if np.isnan(pred_proba[0]).any():
+            logger.error("No model available for latest features")
+            return None
+        
         pred_class = int(np.argmax(pred_proba[0]))
         confidence = float(np.max(pred_proba[0]))
         
+        if self.drift_monitor is not None:
+            self.drift_monitor.update(X, pred_proba)
+        
         # クラスマッピング
         signal = self.class_map.get(pred_class, 'UNKNOWN')
         
@@ -90,6 +149,8 @@ class PredictionEngine:
             'signal': signal,
             'confidence': confidence,
             'timestamp': datetime.now().isoformat() + 'Z',
+            'bar_timestamp': latest_features.index[-1].isoformat(),
+            'model_version': self.model_version,
             'predicted_class': pred_class,
             'class_probabilities': {
                 'SHORT': float(pred_proba[0][0]),
@@ -104,16 +165,25 @@ class PredictionEngine:
             }
         }
         
+        if self.explainer is not None:
+            result['explanation'] = self.explainer.explain_batch(
+                self.model, self.model_version, X
+            )[0]
+        
         logger.info(f"🎯 Prediction: {signal} (confidence: {confidence:.4f})")
         
         return result
     
-    def predict_batch(self, features_df):
+    def predict_batch(self, features_df, symbol=None):
         """
         バッチ予測（複数行の特徴量から予測）
         
+        見積もりメモリが predict_batch の予算を超える場合は行を分割して推論する。
+        ルーティング先モデルが無い行（アンサンブル）は結果に含めない。
+        
         Args:
             features_df (pd.DataFrame): 特徴量データ
+            symbol (str): 通貨ペア（アンサンブルのルーティング用，省略時は設定値）
         
         Returns:
             list: 予測結果のリスト
@@ -121,6 +191,32 @@ class PredictionEngine:
         if self.model is None or len(features_df) == 0:
             return []
         
+        with self.memory.stage('predict_batch'):
+            bytes_per_row = self._batch_row_bytes(features_df)
+            if self.memory.fits('predict_batch', len(features_df) * bytes_per_row):
+                return self._predict_rows(features_df, symbol)
+            
+            rows = self.memory.chunk_rows('predict_batch', bytes_per_row)
+            logger.info(f"   Predicting in chunks of {rows} rows (memory budget)")
+            
+            results = []
+            for start in range(0, len(features_df), rows):
+                results.extend(self._predict_rows(features_df.iloc[start:start + rows], symbol))
+            return results
+    
+    def _batch_row_bytes(self, features_df):
+        """1行あたりのバッチ推論メモリの見積もり（入力, 確率, 結果dict, 寄与度）"""
+        num_class = self.config['model']['lgb_params']['num_class']
+        n_features = len(features_df.columns)
+        
+        bytes_per_row = n_features * 8 + num_class * 8 + RESULT_ROW_BYTES
+        if self.explainer is not None:
+            # pred_contrib の float64 出力と float32 のキャッシュ
+            bytes_per_row += num_class * (n_features + 1) * (8 + 4)
+        return bytes_per_row
+    
+    def _predict_rows(self, features_df, symbol):
+        """バッチ予測の本体"""
         # 目的変数カラムを除去
         X = features_df.drop(
             columns=['target', 'target_return'],
@@ -128,10 +224,26 @@ class PredictionEngine:
         )
         
         # バッチ予測
-        pred_proba = self.model.predict(X)
+        pred_proba = self._predict_proba(X, symbol, self.batch_threads)
+        
+        # ルーティング先が無い行（確率が NaN）は予測なしとして除外
+        routed = ~np.isnan(pred_proba).any(axis=1)
+        if not routed.all():
+            logger.warning(f"Skipping {int((~routed).sum())} rows with no model available")
+            features_df = features_df[routed]
+            X = X[routed]
+            pred_proba = pred_proba[routed]
+        
         pred_classes = np.argmax(pred_proba, axis=1)
         confidences = np.max(pred_proba, axis=1)
         
+        # 寄与度もまとめて計算（キャッシュ済みの行は再計算しない）
+        explanations = None
+        if self.explainer is not None:
+            explanations = self.explainer.explain_batch(
+                self.model, self.model_version, X
+            )
+        
         results = []
         for i in range(len(X)):
             pred_class = int(pred_classes[i])
@@ -143,8 +255,16 @@ class PredictionEngine:
                 'signal': signal,
                 'confidence': confidence,
                 'predicted_class': pred_class,
+                'class_probabilities': {
+                    'SHORT': float(pred_proba[i][0]),
+                    'LONG': float(pred_proba[i][1]),
+                    'NO_TRADE': float(pred_proba[i][2])
+                },
+                'model_version': self.model_version,
                 'close': float(features_df['close'].iloc[i]),
             }
+            if explanations is not None:
+                result['explanation'] = explanations[i]
             results.append(result)
         
         logger.info(f"✅ Batch predictions: {len(results)} rows")
@@ -156,11 +276,22 @@ def main():
     import fetch_data
     import feature_engineer
     import train_model
+    import drift_monitor
+    import signal_store
+    import explain
+    import resources
+    
+    parser = argparse.ArgumentParser(description='Predict the latest signal')
+    parser.add_argument('--explain', action='store_true',
+                        help='特徴量寄与度を計算して結果に含める')
+    args = parser.parse_args()
     
     logger.info("=" * 50)
     logger.info("🔮 Prediction Pipeline")
     logger.info("=" * 50)
     
+    resources.ResourceBudget('config.yaml').apply('serving')
+    
     # データを取得
     data_fetcher = fetch_data.DataFetcher('config.yaml')
     df = data_fetcher.get_latest_data('USDJPY', days=1)
@@ -169,9 +300,9 @@ def main():
         logger.error("❌ Failed to get data")
         return None
     
-    # 特徴量を生成
+    # 特徴量を生成（推論用なのでラベルは作らず，将来データの無い直近の足も残す）
     engineer = feature_engineer.FeatureEngineer('config.yaml')
-    features = engineer.engineer_features(df)
+    features = engineer.engineer_features(df, include_target=False)
     
     if features is None:
         logger.error("❌ Failed to engineer features")
@@ -185,9 +316,27 @@ def main():
         engineer.config['model']['model_path']
     ) / engineer.config['model']['model_filename']
     
-    if engine.load_model(str(model_path)):
+    if engine.config.get('ensemble', {}).get('enabled', False):
+        loaded = engine.load_ensemble()
+    else:
+        loaded = engine.load_model(str(model_path))
+    
+    if loaded:
+        # ドリフト監視（参照プロファイルがある場合のみ）
+        monitor = drift_monitor.DriftMonitor('config.yaml')
+        if monitor.load_reference():
+            monitor.load_state()
+            engine.attach_drift_monitor(monitor)
+        # 寄与度の計算は重いので要求された場合のみ（履歴は backfill で事前計算）
+        if args.explain:
+            engine.attach_explainer(explain.SignalExplainer('config.yaml'))
+        
         # 最新の予測を実施
-        latest_prediction = engine.predict(features)
+        latest_prediction = engine.predict(features, symbol='USDJPY')
+        
+        if engine.drift_monitor is not None:
+            monitor.save_state()
+            monitor.check()
         
         if latest_prediction:
             logger.info("\n📊 Latest Prediction Result:")
@@ -200,6 +349,9 @@ def main():
             
             logger.info(f"💾 Saved prediction to {output_file}")
             
+            # 履歴ストアに追記
+            signal_store.SignalStore('config.yaml').append('USDJPY', [latest_prediction])
+            
             return latest_prediction
     else:
         logger.error("❌ Failed to load model")
@@ -0,0 +1,375 @@
+"""
+リプレイハーネス - 保存済みの足を実際の推論経路に流してレイテンシ/スループットを計測
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import yaml
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from dotenv import load_dotenv
+
+import bar_aggregator
+import cross_asset
+import fetch_data
+import feature_engineer
+import predict
+import resources
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STAGES = ['features', 'predict', 'deliver', 'end_to_end']
+
+# 1本ごとに処理時間（待ち時間を含まない）を持つステージ
+SERVICE_STAGES = ['features', 'predict', 'deliver']
+
+
+def summarize_capacity(service_times, bars_by_symbol):
+    """
+    ステージごとの処理能力（最大持続スループット）を見積もる
+
+    再生速度に依らず，1本あたりの平均処理時間から求める。全ステージが同じ
+    イベントループで動くため，経路全体の処理能力は平均処理時間の合計の逆数。
+
+    Args:
+        service_times (dict): ステージ -> 1本ごとの処理時間（秒）のリスト
+        bars_by_symbol (dict): 通貨ペア -> OHLC足の DataFrame
+
+    Returns:
+        dict: ステージ別の処理能力，ボトルネック，持続可能な最大再生倍率
+    """
+    stages = {}
+    total_service = 0.0
+    for stage in SERVICE_STAGES:
+        values = service_times[stage]
+        if not values:
+            continue
+        mean = float(np.mean(values))
+        total_service += mean
+        stages[stage] = {
+            'mean_service_ms': mean * 1000,
+            'max_bars_per_sec': 1.0 / mean if mean > 0 else None,
+        }
+
+    if not stages:
+        return {}
+
+    pipeline_capacity = 1.0 / total_service if total_service > 0 else None
+
+    # 等倍再生時の到着レート（全通貨ペア合計）
+    arrival_rate = 0.0
+    for bars in bars_by_symbol.values():
+        span = (bars.index[-1] - bars.index[0]).total_seconds()
+        if span > 0:
+            arrival_rate += (len(bars) - 1) / span
+
+    return {
+        'stages': stages,
+        'bottleneck': max(stages, key=lambda stage: stages[stage]['mean_service_ms']),
+        'pipeline_max_bars_per_sec': pipeline_capacity,
+        'arrival_bars_per_sec_at_1x': arrival_rate,
+        # これより速く再生すると待ち行列が伸び続ける
+        'max_sustainable_speed': (
+            pipeline_capacity / arrival_rate
+            if pipeline_capacity and arrival_rate > 0 else None
+        ),
+    }
+
+
+def summarize_latencies(values):
+    """レイテンシ（秒）のリストをミリ秒のパーセンタイルに要約"""
+    if not values:
+        return {}
+
+    ms = np.asarray(values) * 1000
+    return {
+        'count': int(len(ms)),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+class SymbolReplay:
+    """1通貨ペア分の推論経路（足確定 → 特徴量更新 → 推論 → 配信）"""
+
+    def __init__(self, config_path, symbol, bars, engine, delivery_queue, basket=None):
+        """
+        初期化
+
+        Args:
+            basket (pd.DataFrame): バスケット各ペアの終値（クロスアセット有効時，列 = 通貨ペア）
+        """
+        self.symbol = symbol
+        self.bars = bars
+        self.engine = engine
+        self.delivery_queue = delivery_queue
+        self.updater = bar_aggregator.LiveFeatureUpdater(
+            config_path, on_features=self._on_features
+        )
+
+        self.latencies = {stage: [] for stage in STAGES}
+        self.service_times = {stage: [] for stage in SERVICE_STAGES}
+        self.signals = {}
+        self._arrival = None
+        self._bar_start = None
+
+        # バスケットのペアごとの終値と次に流す足の位置（再生開始時点の直近の足から）
+        self.basket = {}
+        self._basket_pos = {}
+        if basket is not None:
+            for basket_symbol in basket.columns:
+                closes = basket[basket_symbol].dropna()
+                self.basket[basket_symbol] = closes
+                first = closes.index.searchsorted(bars.index[0], side='right') - 1
+                self._basket_pos[basket_symbol] = max(first, 0)
+
+    async def _feed_basket(self, timestamp):
+        """足 T の前に時刻 T までのバスケットの確定足を流す（ライブの到着順を再現）"""
+        for basket_symbol, closes in self.basket.items():
+            pos = self._basket_pos[basket_symbol]
+            while pos < len(closes) and closes.index[pos] <= timestamp:
+                await self.updater.update_basket(
+                    basket_symbol, closes.index[pos], closes.iloc[pos]
+                )
+                pos += 1
+            self._basket_pos[basket_symbol] = pos
+
+    def _on_features(self, features):
+        """特徴量更新後に推論して配信キューへ送る"""
+        features_done = time.perf_counter()
+        self.latencies['features'].append(features_done - self._bar_start)
+        self.service_times['features'].append(features_done - self._bar_start)
+
+        result = self.engine.predict(features, symbol=self.symbol)
+        predict_done = time.perf_counter()
+        self.latencies['predict'].append(predict_done - features_done)
+        self.service_times['predict'].append(predict_done - features_done)
+
+        if result is None:
+            return
+
+        bar_timestamp = features.index[-1]
+        self.signals[bar_timestamp] = result
+        self.delivery_queue.put_nowait(
+            (self, bar_timestamp, json.dumps(result), predict_done, self._arrival)
+        )
+
+    async def run(self, speed, start_time):
+        """
+        足を再生
+
+        Args:
+            speed (float): 再生速度倍率（None は待ち時間なし）
+            start_time (float): 再生開始時刻（perf_counter）
+        """
+        origin = self.bars.index[0]
+
+        for timestamp, bar in self.bars.iterrows():
+            if speed is None:
+                arrival = time.perf_counter()
+            else:
+                # 開始時刻からの予定到着時刻（処理遅れは end_to_end に含まれる）
+                arrival = start_time + (timestamp - origin).total_seconds() / speed
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            self._arrival = arrival
+            self._bar_start = time.perf_counter()
+            await self._feed_basket(timestamp)
+            await self.updater(bar)
+
+            # 他の通貨ペア/配信タスクに制御を渡す
+            await asyncio.sleep(0)
+
+        await self.updater.flush()
+
+
+class ReplayHarness:
+    """複数通貨ペアの足を指定倍速で再生し，推論経路を計測するハーネス"""
+
+    def __init__(self, config_path='config.yaml'):
+        """初期化"""
+        self.config_path = config_path
+        self.config = self._load_config(config_path)
+        self.engine = predict.PredictionEngine(config_path)
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def load_model(self):
+        """推論と同じ設定でモデルを読み込む"""
+        if self.config.get('ensemble', {}).get('enabled', False):
+            return self.engine.load_ensemble()
+
+        model_path = Path(self.config['model']['model_path']) / self.config['model']['model_filename']
+        return self.engine.load_model(str(model_path))
+
+    async def _deliver(self, queue):
+        """配信側: シグナルを受け取った時刻を記録"""
+        while True:
+            replay, bar_timestamp, payload, sent, arrival = await queue.get()
+            dequeued = time.perf_counter()
+            json.loads(payload)
+            received = time.perf_counter()
+            replay.latencies['deliver'].append(received - sent)
+            replay.service_times['deliver'].append(received - dequeued)
+            replay.latencies['end_to_end'].append(received - arrival)
+            queue.task_done()
+
+    async def _replay(self, bars_by_symbol, speed):
+        """全通貨ペアを並行に再生"""
+        queue = asyncio.Queue()
+        basket = None
+        if self.config.get('cross_asset', {}).get('enabled', False):
+            # オフラインの特徴量生成と同じ保存済みデータをバスケットとして再生
+            basket = cross_asset.load_basket_closes(self.config_path)
+        replays = [
+            SymbolReplay(self.config_path, symbol, bars, self.engine, queue, basket)
+            for symbol, bars in bars_by_symbol.items()
+        ]
+
+        deliver_task = asyncio.create_task(self._deliver(queue))
+        start_time = time.perf_counter()
+        try:
+            await asyncio.gather(*(replay.run(speed, start_time) for replay in replays))
+            await queue.join()
+        finally:
+            deliver_task.cancel()
+
+        return replays, time.perf_counter() - start_time
+
+    def verify(self, replay):
+        """
+        リプレイ結果をオフラインの predict_batch と比較
+
+        Returns:
+            dict: 比較した件数，シグナル不一致数，確度の最大差
+        """
+        engineer = feature_engineer.FeatureEngineer(self.config_path)
+        features = engineer.engineer_features(replay.bars, include_target=False)
+        offline = self.engine.predict_batch(features, symbol=replay.symbol)
+
+        compared = 0
+        mismatches = 0
+        max_confidence_diff = 0.0
+        for row in offline:
+            # ルーティング先の無い行は predict_batch の結果に含まれないので時刻で照合
+            live = replay.signals.get(pd.Timestamp(row['timestamp'].rstrip('Z')))
+            if live is None:
+                continue
+
+            compared += 1
+            if live['signal'] != row['signal']:
+                mismatches += 1
+            max_confidence_diff = max(
+                max_confidence_diff, abs(live['confidence'] - row['confidence'])
+            )
+
+        return {
+            'compared': compared,
+            'signal_mismatches': mismatches,
+            'max_confidence_diff': max_confidence_diff,
+        }
+
+    def run(self, bars_by_symbol, speed=None):
+        """
+        再生して計測結果を返す
+
+        Args:
+            bars_by_symbol (dict): 通貨ペア -> OHLC足の DataFrame
+            speed (float): 再生速度倍率（None は最速）
+
+        Returns:
+            dict: ステージ別レイテンシ，処理能力，観測スループット，オフライン比較
+        """
+        replays, elapsed = asyncio.run(self._replay(bars_by_symbol, speed))
+
+        total_bars = sum(len(bars) for bars in bars_by_symbol.values())
+        report = {
+            'speed': speed,
+            'symbols': list(bars_by_symbol),
+            'bars': total_bars,
+            'elapsed_seconds': elapsed,
+            # 観測値（倍速再生では到着レートで頭打ちになる）
+            'throughput_bars_per_sec': total_bars / elapsed if elapsed > 0 else None,
+            'latency': {},
+            'capacity': {},
+            'verification': {},
+        }
+
+        for stage in STAGES:
+            values = [v for replay in replays for v in replay.latencies[stage]]
+            report['latency'][stage] = summarize_latencies(values)
+
+        service_times = {
+            stage: [v for replay in replays for v in replay.service_times[stage]]
+            for stage in SERVICE_STAGES
+        }
+        report['capacity'] = summarize_capacity(service_times, bars_by_symbol)
+
+        for replay in replays:
+            report['verification'][replay.symbol] = self.verify(replay)
+
+        return report
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='Replay stored bars through the serving path')
+    parser.add_argument('--symbols', default='USDJPY', help='カンマ区切りの通貨ペア')
+    parser.add_argument('--speed', type=float, default=None, help='再生倍率（省略時は最速）')
+    parser.add_argument('--bars', type=int, default=None, help='通貨ペアごとの足の本数上限')
+    args = parser.parse_args()
+
+    logger.info("=" * 50)
+    logger.info("⏯️  Historical Replay Harness")
+    logger.info("=" * 50)
+
+    resources.ResourceBudget('config.yaml').apply('serving')
+    harness = ReplayHarness('config.yaml')
+    if not harness.load_model():
+        logger.error("❌ Failed to load model")
+        return None
+
+    fetcher = fetch_data.DataFetcher('config.yaml')
+    bars_by_symbol = {}
+    for symbol in args.symbols.split(','):
+        df = fetcher.get_latest_data(symbol, days=harness.config['data']['lookback_days'])
+        if df is None or len(df) == 0:
+            logger.error(f"❌ No stored bars for {symbol}")
+            return None
+        bars_by_symbol[symbol] = df.iloc[-args.bars:] if args.bars else df
+
+    # 計測中の推論ログを抑制
+    logging.getLogger('predict').setLevel(logging.WARNING)
+    logging.getLogger('feature_engineer').setLevel(logging.WARNING)
+
+    report = harness.run(bars_by_symbol, speed=args.speed)
+
+    logger.info("\n📊 Replay Report:")
+    logger.info(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+    return report
+
+
+if __name__ == '__main__':
+    main()
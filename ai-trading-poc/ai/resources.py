@@ -0,0 +1,254 @@
+"""
+実行リソース管理 - 役割（学習/バッチ推論/サービング）ごとのCPUスレッド予算を適用
+"""
+
+import os
+import sys
+import time
+import logging
+import multiprocessing
+import yaml
+import numpy as np
+from pathlib import Path
+from dotenv import load_dotenv
+from threadpoolctl import threadpool_limits
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 子プロセスや後から読み込まれるライブラリにも効くよう設定する環境変数
+THREAD_ENV_VARS = [
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+]
+
+# コア数超過の警告はプロセスごとに1回だけ（ResourceBudget は何度も生成される）
+_oversubscription_warned = False
+
+
+class ResourceBudget:
+    """
+    CPUスレッド予算クラス
+
+    LightGBM / BLAS / ワーカープールがそれぞれ勝手にスレッド数を決めると
+    学習と推論を同時に動かした際にコアを奪い合うため，役割ごとに上限を揃える。
+    """
+
+    def __init__(self, config_path='config.yaml'):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        resources_config = self.config['resources']
+
+        global _oversubscription_warned
+
+        self.total_cores = resources_config.get('total_cores') or os.cpu_count() or 1
+        self.roles = resources_config['roles']
+        self.allocation = self._allocate()
+
+        budgeted = sum(self.allocation.values())
+        if budgeted > self.total_cores and not _oversubscription_warned:
+            logger.warning(
+                f"⚠️  Thread budgets ({budgeted}) exceed total cores ({self.total_cores})"
+            )
+            _oversubscription_warned = True
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def _allocate(self):
+        """
+        役割ごとのスレッド数を決める
+
+        threads > share（total_cores に対する割合）の順に使い，どちらも未設定の
+        役割は残りのコアを等分する（いずれも最低1スレッド，最大 total_cores）。
+
+        Returns:
+            dict: 役割 -> スレッド数
+        """
+        allocation = {}
+        for role, role_config in self.roles.items():
+            role_config = role_config or {}
+            if role_config.get('threads'):
+                allocation[role] = role_config['threads']
+            elif role_config.get('share'):
+                allocation[role] = int(self.total_cores * role_config['share'])
+
+        rest = [role for role in self.roles if role not in allocation]
+        if rest:
+            remaining = self.total_cores - sum(allocation.values())
+            for role in rest:
+                allocation[role] = remaining // len(rest)
+
+        return {
+            role: min(max(allocation[role], 1), self.total_cores)
+            for role in self.roles
+        }
+
+    def threads(self, role):
+        """役割のスレッド数（設定に無い役割は全コア）"""
+        return self.allocation.get(role, self.total_cores)
+
+    def lgb_params(self, role, params):
+        """LightGBMパラメータに num_threads を設定したコピーを返す"""
+        return {**params, 'num_threads': self.threads(role)}
+
+    def apply(self, role):
+        """
+        現在のプロセスに役割の予算を適用
+
+        - BLAS/OpenMP のスレッドプールを threadpoolctl で制限
+        - 子プロセス向けにスレッド数の環境変数を設定
+        - cpu_affinity が指定されていればCPUを固定（Linuxのみ）
+
+        Returns:
+            int: 適用したスレッド数
+        """
+        threads = self.threads(role)
+
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(threads)
+
+        # 読み込み済みのプール（numpy の BLAS, LightGBM の OpenMP）も制限
+        threadpool_limits(limits=threads)
+
+        affinity = (self.roles.get(role) or {}).get('cpu_affinity')
+        if affinity:
+            if hasattr(os, 'sched_setaffinity'):
+                os.sched_setaffinity(0, set(affinity))
+            else:
+                logger.warning("CPU affinity is not supported on this platform")
+
+        logger.info(f"⚙️  Resource role '{role}': {threads} threads"
+                    + (f", cpus {affinity}" if affinity else ""))
+        return threads
+
+
+def _training_load(config_path, features, start_event, stop_event):
+    """学習負荷をかけ続けるワーカー（別プロセス）"""
+    import train_model
+
+    logging.getLogger('train_model').setLevel(logging.WARNING)
+    ResourceBudget(config_path).apply('training')
+
+    trainer = train_model.ModelTrainer(config_path)
+    X_train, _, y_train, _ = trainer.prepare_data(features)
+
+    # 平常時の計測が終わるまで待機
+    start_event.wait()
+    while not stop_event.is_set():
+        trainer.train(X_train, y_train)
+
+
+def _measure(engine, features, num_requests):
+    """推論1回ごとのレイテンシ（秒）を計測"""
+    latencies = []
+    for _ in range(num_requests):
+        start = time.perf_counter()
+        engine.predict(features)
+        latencies.append(time.perf_counter() - start)
+    return np.asarray(latencies)
+
+
+def check_latency_under_load(config_path='config.yaml', num_requests=200):
+    """
+    学習を並行実行した状態でサービングのレイテンシが劣化しすぎないか確認
+
+    Returns:
+        dict: 平常時/学習負荷時の p50/p99 と判定結果
+    """
+    import fetch_data
+    import feature_engineer
+    import predict
+
+    budget = ResourceBudget(config_path)
+    max_ratio = budget.config['resources']['max_latency_ratio']
+    config = budget.config
+
+    df = fetch_data.DataFetcher(config_path).get_latest_data(
+        config['data']['symbol'], days=config['data']['lookback_days']
+    )
+    if df is None:
+        logger.error("❌ Failed to get data")
+        return None
+
+    engineer = feature_engineer.FeatureEngineer(config_path)
+    train_features = engineer.engineer_features(df)
+    serve_features = engineer.engineer_features(df, include_target=False)
+
+    engine = predict.PredictionEngine(config_path)
+    model_path = Path(config['model']['model_path']) / config['model']['model_filename']
+    if not engine.load_model(str(model_path)):
+        logger.error("❌ Failed to load model")
+        return None
+
+    # CPU固定を引き継がないよう，サービングの予算を適用する前に学習プロセスを起動
+    start_event = multiprocessing.Event()
+    stop_event = multiprocessing.Event()
+    worker = multiprocessing.Process(
+        target=_training_load,
+        args=(config_path, train_features, start_event, stop_event)
+    )
+    worker.start()
+    try:
+        budget.apply('serving')
+        logging.getLogger('predict').setLevel(logging.WARNING)
+        baseline = _measure(engine, serve_features, num_requests)
+
+        start_event.set()
+        # 学習が走り始めるまで待つ
+        time.sleep(2)
+        loaded = _measure(engine, serve_features, num_requests)
+    finally:
+        stop_event.set()
+        worker.join(timeout=60)
+        if worker.is_alive():
+            worker.terminate()
+
+    baseline_p99 = float(np.percentile(baseline, 99) * 1000)
+    loaded_p99 = float(np.percentile(loaded, 99) * 1000)
+    report = {
+        'baseline_p50_ms': float(np.percentile(baseline, 50) * 1000),
+        'baseline_p99_ms': baseline_p99,
+        'loaded_p50_ms': float(np.percentile(loaded, 50) * 1000),
+        'loaded_p99_ms': loaded_p99,
+        'max_latency_ratio': max_ratio,
+        'passed': loaded_p99 <= baseline_p99 * max_ratio,
+    }
+    return report
+
+
+def main():
+    """メイン処理（学習負荷下のサービングレイテンシを確認）"""
+    logger.info("=" * 50)
+    logger.info("⚙️  Serving Latency Under Training Load")
+    logger.info("=" * 50)
+
+    report = check_latency_under_load('config.yaml')
+    if report is None:
+        sys.exit(1)
+
+    for key, value in report.items():
+        logger.info(f"  {key}: {value}")
+
+    if not report['passed']:
+        logger.error("❌ Serving p99 latency degraded beyond the allowed ratio")
+        sys.exit(1)
+
+    logger.info("✅ Serving latency within budget")
+    return report
+
+
+if __name__ == '__main__':
+    main()
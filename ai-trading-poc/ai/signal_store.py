@@ -0,0 +1,302 @@
+"""
+シグナル履歴ストア - 生成した全シグナルを (symbol, 日付) 単位の列指向ファイルに保存
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+import tempfile
+from datetime import datetime
+import yaml
+import pandas as pd
+from pathlib import Path
+from dotenv import load_dotenv
+
+# 環境変数ロード
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+COLUMNS = [
+    'timestamp', 'signal', 'confidence', 'predicted_class',
+    'prob_short', 'prob_long', 'prob_no_trade',
+    'model_version', 'created_at',
+]
+
+
+class SignalStore:
+    """
+    シグナル履歴ストア
+
+    ``store_path/symbol=USDJPY/date=2024-01-02.parquet`` のように
+    通貨ペア/日付でパーティション分割し，1パーティション内は timestamp で
+    ソート・重複排除して保持する（同じ足の再計算は上書き）。
+    """
+
+    def __init__(self, config_path='config.yaml'):
+        """初期化"""
+        self.config = self._load_config(config_path)
+        self.store_path = Path(self.config['signals']['store_path'])
+        self.store_path.mkdir(parents=True, exist_ok=True)
+        self.page_size = self.config['signals']['page_size']
+        self.max_page_size = self.config['signals']['max_page_size']
+
+    @staticmethod
+    def _load_config(config_path):
+        """YAMLコンフィグを読み込む"""
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+
+    def _symbol_path(self, symbol):
+        """通貨ペアのディレクトリ"""
+        return self.store_path / f"symbol={symbol}"
+
+    def _partition_file(self, symbol, date):
+        """日付パーティションのファイル"""
+        return self._symbol_path(symbol) / f"date={date:%Y-%m-%d}.parquet"
+
+    @staticmethod
+    def _to_frame(results):
+        """predict / predict_batch の結果を保存用の DataFrame に変換"""
+        created_at = pd.Timestamp(datetime.now())
+        rows = []
+        for result in results:
+            # predict() は bar_timestamp，predict_batch() は timestamp が足の時刻
+            bar_time = result.get('bar_timestamp') or result['timestamp']
+            probabilities = result.get('class_probabilities', {})
+            rows.append({
+                'timestamp': pd.Timestamp(bar_time.rstrip('Z')),
+                'signal': result['signal'],
+                'confidence': result['confidence'],
+                'predicted_class': result['predicted_class'],
+                'prob_short': probabilities.get('SHORT'),
+                'prob_long': probabilities.get('LONG'),
+                'prob_no_trade': probabilities.get('NO_TRADE'),
+                'model_version': result.get('model_version'),
+                'created_at': created_at,
+            })
+
+        frame = pd.DataFrame(rows, columns=COLUMNS)
+        frame['predicted_class'] = frame['predicted_class'].astype('int8')
+        for col in ('confidence', 'prob_short', 'prob_long', 'prob_no_trade'):
+            frame[col] = frame[col].astype('float32')
+        for col in ('signal', 'model_version'):
+            frame[col] = frame[col].astype('category')
+        return frame
+
+    def append(self, symbol, results):
+        """
+        シグナルを追記
+
+        Args:
+            symbol (str): 通貨ペア
+            results (list): predict / predict_batch の結果
+
+        Returns:
+            int: 書き込んだ行数
+        """
+        if not results:
+            return 0
+
+        frame = self._to_frame(results)
+        self._symbol_path(symbol).mkdir(parents=True, exist_ok=True)
+
+        # 触るパーティションだけを読み書き（1日分なので書き直しても小さい）
+        for date, rows in frame.groupby(frame['timestamp'].dt.normalize()):
+            partition = self._partition_file(symbol, date)
+            if partition.exists():
+                rows = pd.concat([pd.read_parquet(partition), rows], ignore_index=True)
+
+            rows = (
+                rows.drop_duplicates(subset='timestamp', keep='last')
+                .sort_values('timestamp')
+                .reset_index(drop=True)
+            )
+
+            # 同時に動く predict.py と一時ファイルが衝突しないようプロセスごとに別名
+            with tempfile.NamedTemporaryFile(
+                dir=partition.parent, prefix=f"{partition.stem}.", suffix='.tmp', delete=False
+            ) as tmp:
+                tmp_file = tmp.name
+            try:
+                rows.to_parquet(tmp_file, index=False)
+                os.replace(tmp_file, partition)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+
+        logger.info(f"💾 Stored {len(frame)} signals for {symbol}")
+        return len(frame)
+
+    @staticmethod
+    def _parse_time(value):
+        """
+        クエリの時刻を保存形式（タイムゾーンなしのUTC）に揃える
+
+        2026-10-18T00:00:00Z のようにオフセット付きの場合はUTCに変換して外す
+        """
+        if not value:
+            return None
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert(None)
+        return timestamp
+
+    def query(self, symbol, start=None, end=None, limit=None, cursor=None):
+        """
+        期間指定でシグナルを取得（ページング）
+
+        Args:
+            symbol (str): 通貨ペア
+            start (str): 開始時刻（含む，オフセット無しはUTC）
+            end (str): 終了時刻（含む，オフセット無しはUTC）
+            limit (int): 1ページの件数
+            cursor (str): 前ページの next_cursor（この時刻より後から返す）
+
+        Returns:
+            dict: {'items': [...], 'next_cursor': str | None}
+        """
+        limit = min(limit or self.page_size, self.max_page_size)
+        start = self._parse_time(start)
+        end = self._parse_time(end)
+        cursor = self._parse_time(cursor)
+
+        lower = cursor if start is None else (start if cursor is None else max(start, cursor))
+
+        partitions = []
+        for partition in sorted(self._symbol_path(symbol).glob('date=*.parquet')):
+            date = pd.Timestamp(partition.stem.split('=', 1)[1])
+            if lower is not None and date < lower.normalize():
+                continue
+            if end is not None and date > end.normalize():
+                break
+            partitions.append(partition)
+
+        collected = []
+        count = 0
+        for partition in partitions:
+            rows = pd.read_parquet(partition)
+            if start is not None:
+                rows = rows[rows['timestamp'] >= start]
+            if cursor is not None:
+                rows = rows[rows['timestamp'] > cursor]
+            if end is not None:
+                rows = rows[rows['timestamp'] <= end]
+
+            collected.append(rows)
+            count += len(rows)
+            # 次ページの有無を判定できるだけ読んだら終了
+            if count > limit:
+                break
+
+        if not collected:
+            return {'items': [], 'next_cursor': None}
+
+        page = pd.concat(collected, ignore_index=True)
+        has_more = len(page) > limit
+        page = page.iloc[:limit]
+
+        items = []
+        for row in page.itertuples(index=False):
+            items.append({
+                'timestamp': row.timestamp.isoformat(),
+                'signal': row.signal,
+                'confidence': float(row.confidence),
+                'predicted_class': int(row.predicted_class),
+                'class_probabilities': {
+                    'SHORT': float(row.prob_short),
+                    'LONG': float(row.prob_long),
+                    'NO_TRADE': float(row.prob_no_trade),
+                },
+                'model_version': row.model_version if isinstance(row.model_version, str) else None,
+            })
+
+        next_cursor = items[-1]['timestamp'] if has_more and items else None
+        return {'items': items, 'next_cursor': next_cursor}
+
+
+def backfill(symbol, days):
+    """過去データから predict_batch でシグナルを一括生成して保存"""
+    import fetch_data
+    import feature_engineer
+    import predict
+    import explain
+    import resources
+    import memory_tracker
+
+    resources.ResourceBudget('config.yaml').apply('batch_scoring')
+    memory_tracker.enable_tracing()
+
+    data_fetcher = fetch_data.DataFetcher('config.yaml')
+    df = data_fetcher.get_latest_data(symbol, days=days)
+    if df is None:
+        logger.error("❌ Failed to get data")
+        return None
+
+    engineer = feature_engineer.FeatureEngineer('config.yaml')
+    features = engineer.engineer_features(df, include_target=False)
+    if features is None:
+        logger.error("❌ Failed to engineer features")
+        return None
+
+    engine = predict.PredictionEngine('config.yaml')
+    if engine.config.get('ensemble', {}).get('enabled', False):
+        loaded = engine.load_ensemble()
+    else:
+        model_path = Path(engine.config['model']['model_path']) / engine.config['model']['model_filename']
+        loaded = engine.load_model(str(model_path))
+
+    if not loaded:
+        logger.error("❌ Failed to load model")
+        return None
+
+    # 説明（寄与度）も同じバッチで計算してキャッシュ
+    engine.attach_explainer(explain.SignalExplainer('config.yaml', symbol=symbol))
+    results = engine.predict_batch(features, symbol=symbol)
+    return SignalStore('config.yaml').append(symbol, results)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='Signal history store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = subparsers.add_parser('query', help='期間指定で取得（JSONを標準出力）')
+    query_parser.add_argument('--symbol', default='USDJPY')
+    query_parser.add_argument('--start')
+    query_parser.add_argument('--end')
+    query_parser.add_argument('--limit', type=int)
+    query_parser.add_argument('--cursor')
+
+    backfill_parser = subparsers.add_parser('backfill', help='過去データから一括生成')
+    backfill_parser.add_argument('--symbol', default='USDJPY')
+    backfill_parser.add_argument('--days', type=int, default=7)
+
+    args = parser.parse_args()
+
+    if args.command == 'query':
+        store = SignalStore('config.yaml')
+        page = store.query(args.symbol, args.start, args.end, args.limit, args.cursor)
+        print(json.dumps(page, ensure_ascii=False))
+        return page
+
+    logger.info("=" * 50)
+    logger.info("🗂️  Signal History Backfill")
+    logger.info("=" * 50)
+
+    written = backfill(args.symbol, args.days)
+    if written is None:
+        sys.exit(1)
+    logger.info(f"✅ Backfilled {written} signals")
+    return written
+
+
+if __name__ == '__main__':
+    main()
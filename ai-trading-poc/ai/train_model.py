@@ -6,7 +6,9 @@ import os
 import sys
 import logging
 from datetime import datetime
+import json
 import pickle
+import hashlib
 import yaml
 import pandas as pd
 import numpy as np
@@ -27,17 +29,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# LightGBM の Dataset 構築時のメモリ倍率（元データ + ビン化した特徴量）
+DATASET_COPY_FACTOR = 2
+
 
 class ModelTrainer:
     """LightGBMモデル学習クラス"""
     
     def __init__(self, config_path='config.yaml'):
         """初期化"""
+        import resources
+        import memory_tracker
+        
         self.config = self._load_config(config_path)
+        self.memory = memory_tracker.MemoryTracker(config_path)
         self.model_path = Path(self.config['model']['model_path'])
         self.model_path.mkdir(parents=True, exist_ok=True)
         
-        self.lgb_params = self.config['model']['lgb_params']
+        # 学習用のスレッド予算を num_threads として渡す
+        budget = resources.ResourceBudget(config_path)
+        self.lgb_params = budget.lgb_params('training', self.config['model']['lgb_params'])
         self.model = None
     
     @staticmethod
@@ -58,25 +69,29 @@ class ModelTrainer:
         """
         logger.info("📊 Preparing training data...")
         
-        # 目的変数と特徴量を分離
-        y = features['target'].copy()
-        X = features.drop(columns=['target', 'target_return']).copy()
-        
-        # NaNを削除
-        valid_idx = ~y.isna()
-        X = X[valid_idx]
-        y = y[valid_idx]
-        
-        logger.info(f"   Total samples: {len(X)}")
-        logger.info(f"   Class distribution: {y.value_counts().to_dict()}")
-        
-        # 時系列データなので，ランダム分割ではなく時間順に分割
-        split_point = int(len(X) * (1 - self.config['model']['validation_split']))
+        # 特徴量のコピーは1回だけ（分割は同じ長さなので合計でも約1倍）
+        self.memory.require(
+            'prepare_data', int(features.memory_usage(index=True).sum()),
+            detail=f"{len(features)} feature rows"
+        )
         
-        X_train = X.iloc[:split_point]
-        X_test = X.iloc[split_point:]
-        y_train = y.iloc[:split_point]
-        y_test = y.iloc[split_point:]
+        with self.memory.stage('prepare_data'):
+            # NaNを削除しつつ目的変数と特徴量を分離（1回の抽出でコピー）
+            valid_idx = features['target'].notna().to_numpy()
+            feature_columns = features.columns.drop(['target', 'target_return'])
+            X = features.loc[valid_idx, feature_columns]
+            y = features.loc[valid_idx, 'target']
+            
+            logger.info(f"   Total samples: {len(X)}")
+            logger.info(f"   Class distribution: {y.value_counts().to_dict()}")
+            
+            # 時系列データなので，ランダム分割ではなく時間順に分割
+            split_point = int(len(X) * (1 - self.config['model']['validation_split']))
+            
+            X_train = X.iloc[:split_point]
+            X_test = X.iloc[split_point:]
+            y_train = y.iloc[:split_point]
+            y_test = y.iloc[split_point:]
         
         logger.info(f"   Train samples: {len(X_train)}")
         logger.info(f"   Test samples: {len(X_test)}")
@@ -93,22 +108,28 @@ class ModelTrainer:
         """
         logger.info("🎓 Training LightGBM model...")
         
-        # LightGBMデータセットを作成
-        train_data = lgb.Dataset(
-            X_train,
-            label=y_train,
-            feature_name=list(X_train.columns)
+        self.memory.require(
+            'train', int(X_train.memory_usage(index=False).sum()) * DATASET_COPY_FACTOR,
+            detail=f"{len(X_train)} training rows"
         )
         
-        # パラメータをログ出力
-        logger.info(f"   Model params: {self.lgb_params}")
-        
-        # 学習
-        self.model = lgb.train(
-            self.lgb_params,
-            train_data,
-            num_boost_round=self.config['model']['num_boosting_rounds']
-        )
+        with self.memory.stage('train'):
+            # LightGBMデータセットを作成
+            train_data = lgb.Dataset(
+                X_train,
+                label=y_train,
+                feature_name=list(X_train.columns)
+            )
+            
+            # パラメータをログ出力
+            logger.info(f"   Model params: {self.lgb_params}")
+            
+            # 学習
+            self.model = lgb.train(
+                self.lgb_params,
+                train_data,
+                num_boost_round=self.config['model']['num_boosting_rounds']
+            )
         
         logger.info("✅ Model training complete")
     
@@ -182,6 +203,49 @@ class ModelTrainer:
         logger.info(f"💾 Model saved to {model_file}")
         return model_file
     
+    def save_reference_profile(self, X_holdout):
+        """
+        ドリフト監視用に分布プロファイルを保存
+        
+        Args:
+            X_holdout (pd.DataFrame): 学習に使っていない検証データ（X_test）
+        """
+        import drift_monitor
+        
+        if self.model is None:
+            logger.error("No model to profile")
+            return None
+        
+        drift_config = self.config['drift']
+        profile = drift_monitor.build_reference_profile(
+            X_holdout,
+            self.model.predict(X_holdout),
+            num_bins=drift_config['num_bins'],
+            exclude_columns=drift_config.get('exclude_columns', [])
+        )
+        
+        profile_file = self.model_path / drift_config['reference_filename']
+        with open(profile_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat() + 'Z',
+                'num_samples': len(X_holdout),
+                'columns': profile
+            }, f)
+        
+        # 再学習済みなので古いトリガーは削除
+        trigger_file = self.model_path / drift_config['trigger_filename']
+        if trigger_file.exists():
+            trigger_file.unlink()
+        
+        logger.info(f"💾 Reference profile saved to {profile_file}")
+        return profile_file
+    
+    @staticmethod
+    def model_version(model_path):
+        """モデルファイルの内容からバージョン（短いハッシュ）を求める"""
+        with open(model_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    
     @staticmethod
     def load_model(model_path):
         """保存されたモデルを読み込む"""
@@ -199,11 +263,16 @@ class ModelTrainer:
 def main():
     """メイン処理"""
     import feature_engineer
+    import resources
+    import memory_tracker
     
     logger.info("=" * 50)
     logger.info("🎓 Model Training Pipeline")
     logger.info("=" * 50)
     
+    resources.ResourceBudget('config.yaml').apply('training')
+    memory_tracker.enable_tracing()
+    
     # 特徴量を取得
     engineer = feature_engineer.FeatureEngineer('config.yaml')
     features = engineer.get_latest_features('USDJPY')
@@ -223,6 +292,7 @@ def main():
         
         # モデルを保存
         trainer.save_model('USDJPY')
+        trainer.save_reference_profile(X_test)
         
         logger.info("\n✅ Training pipeline complete!")
         return trainer.model
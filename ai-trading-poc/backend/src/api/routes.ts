@@ -9,14 +9,19 @@ import {
   NextFunction,
 } from 'express';
 import { PythonRunner } from '../services/pythonRunner';
+import { TrainingJobQueue } from '../services/jobQueue';
 import {
   ApiResponse,
   HealthStatus,
+  PredictionResult,
+  SignalHistoryPage,
   SystemMetrics,
+  TrainingJob,
 } from '../types';
 
 const router = Router();
 let pythonRunner: PythonRunner;
+let trainingQueue: TrainingJobQueue;
 let startTime = Date.now();
 let predictionCount = 0;
 
@@ -27,6 +32,13 @@ export function setupPythonRunner(runner: PythonRunner) {
   pythonRunner = runner;
 }
 
+/**
+ * 学習ジョブキューを設定
+ */
+export function setupTrainingQueue(queue: TrainingJobQueue) {
+  trainingQueue = queue;
+}
+
 /**
  * エラーハンドラミドルウェア
  */
@@ -44,12 +56,16 @@ router.get(
   asyncHandler(async (req: Request, res: Response) => {
     const pythonAvailable = await pythonRunner.isPythonAvailable();
     const modelLoaded = pythonRunner.isModelAvailable();
+    const retrainTrigger = pythonRunner.getRetrainTrigger();
 
     const health: HealthStatus = {
       status:
         pythonAvailable && modelLoaded ? 'healthy' : 'unhealthy',
       python_available: pythonAvailable,
       model_loaded: modelLoaded,
+      retrain_recommended: retrainTrigger !== null,
+      drifted_columns: retrainTrigger?.drifted_columns ?? [],
+      drift_detected_at: retrainTrigger?.detected_at ?? null,
       api_timestamp: new Date().toISOString(),
     };
 
@@ -91,13 +107,29 @@ router.get(
   })
 );
 
+/**
+ * 説明（特徴量寄与度）は explain=true の場合のみ返す
+ */
+function withExplanation(
+  prediction: PredictionResult,
+  req: Request
+): PredictionResult {
+  if (req.query.explain === 'true') {
+    return prediction;
+  }
+  const { explanation, ...rest } = prediction;
+  return rest;
+}
+
 /**
  * GET /api/signal - 最新の予測シグナルを取得
+ *
+ * クエリ: explain=true で特徴量寄与度を含める
  */
 router.get(
   '/api/signal',
   asyncHandler(async (req: Request, res: Response) => {
-    const prediction = await pythonRunner.predict();
+    const prediction = await pythonRunner.predict(req.query.explain === 'true');
 
     if (prediction === null) {
       const response: ApiResponse<null> = {
@@ -109,9 +141,9 @@ router.get(
     } else {
       predictionCount++;
 
-      const response: ApiResponse<typeof prediction> = {
+      const response: ApiResponse<PredictionResult> = {
         success: true,
-        data: prediction,
+        data: withExplanation(prediction, req),
         timestamp: new Date().toISOString(),
       };
       res.json(response);
@@ -120,49 +152,138 @@ router.get(
 );
 
 /**
- * POST /api/train - モデルを再学習
+ * GET /api/signals - シグナル履歴を期間指定で取得（ページング）
+ *
+ * クエリ: symbol, start, end (ISO 8601), limit, cursor (前ページの next_cursor)
  */
-router.post(
-  '/api/train',
+router.get(
+  '/api/signals',
   asyncHandler(async (req: Request, res: Response) => {
-    console.log('🎓 Starting model training...');
+    const symbol = String(req.query.symbol ?? 'USDJPY');
+    const timeParams = ['start', 'end', 'cursor'] as const;
+    const times: { [key: string]: string | undefined } = {};
+
+    for (const name of timeParams) {
+      const value = req.query[name];
+      if (value === undefined) {
+        continue;
+      }
+      if (typeof value !== 'string' || isNaN(Date.parse(value))) {
+        res.status(400).json({
+          success: false,
+          error: `Invalid ${name}`,
+          timestamp: new Date().toISOString(),
+        });
+        return;
+      }
+      times[name] = value;
+    }
 
-    // 順序: fetch_data -> feature_engineer -> train_model
-    const fetchSuccess = await pythonRunner.fetchData();
-    if (!fetchSuccess) {
-      res.status(500).json({
+    const limit =
+      req.query.limit !== undefined ? Number(req.query.limit) : undefined;
+
+    if (
+      !/^[A-Z]{6}$/.test(symbol) ||
+      (limit !== undefined && (!Number.isInteger(limit) || limit <= 0))
+    ) {
+      res.status(400).json({
         success: false,
-        error: 'Failed to fetch data',
+        error: 'Invalid symbol or limit',
         timestamp: new Date().toISOString(),
       });
       return;
     }
 
-    const engineSuccess = await pythonRunner.engineFeatures();
-    if (!engineSuccess) {
+    const page = await pythonRunner.querySignals({
+      symbol,
+      start: times.start,
+      end: times.end,
+      cursor: times.cursor,
+      limit,
+    });
+
+    if (page === null) {
       res.status(500).json({
         success: false,
-        error: 'Failed to engineer features',
+        error: 'Failed to query signal history',
         timestamp: new Date().toISOString(),
       });
       return;
     }
 
-    const trainSuccess = await pythonRunner.trainModel();
-    if (!trainSuccess) {
-      res.status(500).json({
+    const response: ApiResponse<SignalHistoryPage> = {
+      success: true,
+      data: page,
+      timestamp: new Date().toISOString(),
+    };
+
+    res.json(response);
+  })
+);
+
+/**
+ * POST /api/train - モデル再学習ジョブを登録（バックグラウンド実行）
+ */
+router.post(
+  '/api/train',
+  asyncHandler(async (req: Request, res: Response) => {
+    const job = trainingQueue.enqueue();
+
+    if (job === null) {
+      res.status(429).json({
         success: false,
-        error: 'Failed to train model',
+        error: 'Training queue is full',
         timestamp: new Date().toISOString(),
       });
       return;
     }
 
-    pythonRunner.clearCache();
+    const response: ApiResponse<TrainingJob> = {
+      success: true,
+      data: job,
+      timestamp: new Date().toISOString(),
+    };
+
+    res.status(202).json(response);
+  })
+);
+
+/**
+ * GET /api/train/jobs - 学習ジョブ一覧
+ */
+router.get(
+  '/api/train/jobs',
+  asyncHandler(async (req: Request, res: Response) => {
+    const response: ApiResponse<TrainingJob[]> = {
+      success: true,
+      data: trainingQueue.listJobs(),
+      timestamp: new Date().toISOString(),
+    };
+
+    res.json(response);
+  })
+);
+
+/**
+ * GET /api/train/jobs/:id - 学習ジョブの状態と進捗
+ */
+router.get(
+  '/api/train/jobs/:id',
+  asyncHandler(async (req: Request, res: Response) => {
+    const job = trainingQueue.getJob(req.params.id);
+
+    if (job === null) {
+      res.status(404).json({
+        success: false,
+        error: 'Job not found',
+        timestamp: new Date().toISOString(),
+      });
+      return;
+    }
 
-    const response: ApiResponse<{ trained: boolean }> = {
+    const response: ApiResponse<TrainingJob> = {
       success: true,
-      data: { trained: true },
+      data: job,
       timestamp: new Date().toISOString(),
     };
 
@@ -178,7 +299,7 @@ router.post(
   asyncHandler(async (req: Request, res: Response) => {
     pythonRunner.clearCache();
 
-    const prediction = await pythonRunner.predict();
+    const prediction = await pythonRunner.predict(req.query.explain === 'true');
 
     if (prediction === null) {
       res.status(500).json({
@@ -191,9 +312,9 @@ router.post(
 
     predictionCount++;
 
-    const response: ApiResponse<typeof prediction> = {
+    const response: ApiResponse<PredictionResult> = {
       success: true,
-      data: prediction,
+      data: withExplanation(prediction, req),
       timestamp: new Date().toISOString(),
     };
 
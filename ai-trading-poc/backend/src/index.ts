@@ -6,8 +6,12 @@ import express, { Express, Request, Response } from 'express';
 import cors from 'cors';
 import dotenv from 'dotenv';
 import path from 'path';
-import apiRoutes, { setupPythonRunner } from './api/routes';
+import apiRoutes, {
+  setupPythonRunner,
+  setupTrainingQueue,
+} from './api/routes';
 import { PythonRunner } from './services/pythonRunner';
+import { TrainingJobQueue } from './services/jobQueue';
 
 // 環境変数をロード
 dotenv.config({
@@ -18,6 +22,11 @@ const app: Express = express();
 const PORT = process.env.BACKEND_PORT || 5000;
 const PYTHON_PATH = process.env.PYTHON_PATH || 'python';
 const AI_DIR = '../ai';
+const TRAIN_MAX_CONCURRENT = Number(process.env.TRAIN_MAX_CONCURRENT || 1);
+const RETRAIN_ON_DRIFT = process.env.RETRAIN_ON_DRIFT === 'true';
+const RETRAIN_CHECK_INTERVAL = Number(
+  process.env.RETRAIN_CHECK_INTERVAL || 600000
+); // 10分（ミリ秒）
 
 // ===== ミドルウェア設定 =====
 
@@ -52,6 +61,14 @@ app.use((req: Request, res: Response, next) => {
 const pythonRunner = new PythonRunner(PYTHON_PATH, AI_DIR);
 setupPythonRunner(pythonRunner);
 
+const trainingQueue = new TrainingJobQueue(pythonRunner, TRAIN_MAX_CONCURRENT);
+setupTrainingQueue(trainingQueue);
+
+// ドリフト監視の再学習トリガーを定期的に確認して学習ジョブを登録（任意）
+if (RETRAIN_ON_DRIFT) {
+  setInterval(() => trainingQueue.enqueueOnDrift(), RETRAIN_CHECK_INTERVAL);
+}
+
 // ===== ルート定義 =====
 
 /**
@@ -66,7 +83,9 @@ app.get('/', (req: Request, res: Response) => {
       health: 'GET /health',
       metrics: 'GET /metrics',
       signal: 'GET /api/signal',
+      signals: 'GET /api/signals',
       train: 'POST /api/train',
+      train_jobs: 'GET /api/train/jobs/:id',
       refresh: 'POST /api/refresh',
     },
   });
@@ -125,7 +144,9 @@ async function startServer() {
       console.log(`  GET  http://localhost:${PORT}/health     (Health)`);
       console.log(`  GET  http://localhost:${PORT}/metrics    (Metrics)`);
       console.log(`  GET  http://localhost:${PORT}/api/signal (Prediction)`);
+      console.log(`  GET  http://localhost:${PORT}/api/signals (Signal History)`);
       console.log(`  POST http://localhost:${PORT}/api/train  (Train Model)`);
+      console.log(`  GET  http://localhost:${PORT}/api/train/jobs/:id (Training Status)`);
       console.log(`  POST http://localhost:${PORT}/api/refresh (Refresh Cache)`);
       console.log('');
       console.log('Usage:');
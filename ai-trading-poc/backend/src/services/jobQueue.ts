@@ -0,0 +1,177 @@
+/**
+ * 学習ジョブキュー - モデル学習をバックグラウンドで実行
+ */
+
+import { randomUUID } from 'crypto';
+import { PythonRunner } from './pythonRunner';
+import { TrainingJob } from '../types';
+
+const logger = console;
+
+/**
+ * 学習パイプラインのステージ（実行順）
+ *
+ * pipeline.py が1プロセス内で実行し，ステージごとの進捗を標準出力に書く
+ */
+const PIPELINE_STAGES = ['fetch', 'features', 'train', 'evaluate', 'save'];
+
+export class TrainingJobQueue {
+  private runner: PythonRunner;
+  private maxConcurrent: number;
+  private maxQueued: number;
+  private maxHistory: number;
+  private jobs: Map<string, TrainingJob> = new Map();
+  private pending: string[] = [];
+  private running: number = 0;
+  private lastStartedAt: number | null = null; // 直近のジョブ開始時刻（ミリ秒）
+
+  constructor(
+    runner: PythonRunner,
+    maxConcurrent: number = 1,
+    maxQueued: number = 5,
+    maxHistory: number = 50
+  ) {
+    this.runner = runner;
+    this.maxConcurrent = maxConcurrent;
+    this.maxQueued = maxQueued;
+    this.maxHistory = maxHistory;
+  }
+
+  /**
+   * 学習ジョブを登録（キューが満杯ならnull）
+   */
+  enqueue(): TrainingJob | null {
+    if (this.pending.length >= this.maxQueued) {
+      logger.warn('⚠️  Training queue is full');
+      return null;
+    }
+
+    const job: TrainingJob = {
+      id: randomUUID(),
+      status: 'queued',
+      stage: null,
+      completed_stages: 0,
+      total_stages: PIPELINE_STAGES.length,
+      error: null,
+      created_at: new Date().toISOString(),
+      started_at: null,
+      finished_at: null,
+    };
+
+    this.jobs.set(job.id, job);
+    this.pending.push(job.id);
+    this.pruneHistory();
+
+    logger.log(`📥 Training job queued: ${job.id}`);
+    this.drain();
+    return job;
+  }
+
+  /**
+   * ドリフト監視の再学習トリガーが出ていれば学習ジョブを登録
+   *
+   * 待機中/実行中のジョブがある場合や，トリガーが直近のジョブ開始より前に
+   * 出たもの（そのジョブで対応済み）の場合は登録しない
+   */
+  enqueueOnDrift(): TrainingJob | null {
+    const trigger = this.runner.getRetrainTrigger();
+    if (trigger === null || this.pending.length > 0 || this.running > 0) {
+      return null;
+    }
+
+    const detectedAt = Date.parse(trigger.detected_at);
+    if (this.lastStartedAt !== null && detectedAt <= this.lastStartedAt) {
+      return null;
+    }
+
+    logger.log(
+      `🔁 Drift detected in ${trigger.drifted_columns.join(', ')}, enqueueing retrain`
+    );
+    return this.enqueue();
+  }
+
+  /**
+   * ジョブを取得
+   */
+  getJob(id: string): TrainingJob | null {
+    return this.jobs.get(id) ?? null;
+  }
+
+  /**
+   * 全ジョブを新しい順に取得
+   */
+  listJobs(): TrainingJob[] {
+    return Array.from(this.jobs.values()).reverse();
+  }
+
+  /**
+   * 空きがあれば待機中のジョブを開始
+   */
+  private drain(): void {
+    while (this.running < this.maxConcurrent && this.pending.length > 0) {
+      const id = this.pending.shift() as string;
+      const job = this.jobs.get(id);
+      if (!job) {
+        continue;
+      }
+
+      this.running++;
+      this.execute(job).finally(() => {
+        this.running--;
+        this.drain();
+      });
+    }
+  }
+
+  /**
+   * 学習パイプラインを実行し，進捗をジョブに反映
+   */
+  private async execute(job: TrainingJob): Promise<void> {
+    job.status = 'running';
+    job.started_at = new Date().toISOString();
+    this.lastStartedAt = Date.now();
+    logger.log(`🎓 Training job started: ${job.id}`);
+
+    try {
+      const success = await this.runner.runPipeline((progress) => {
+        job.stage = progress.stage;
+        job.completed_stages = progress.completed;
+        job.total_stages = progress.total;
+      });
+
+      if (!success) {
+        job.status = 'failed';
+        job.error = job.stage
+          ? `Training pipeline failed at stage: ${job.stage}`
+          : 'Failed to run training pipeline';
+        logger.error(`❌ Training job ${job.id} failed: ${job.error}`);
+        return;
+      }
+
+      this.runner.clearCache();
+      job.status = 'completed';
+      job.stage = null;
+      logger.log(`✅ Training job completed: ${job.id}`);
+    } catch (error) {
+      job.status = 'failed';
+      job.error = error instanceof Error ? error.message : String(error);
+      logger.error(`❌ Training job ${job.id} failed:`, error);
+    } finally {
+      job.finished_at = new Date().toISOString();
+    }
+  }
+
+  /**
+   * 完了済みジョブの履歴を上限までに抑える
+   */
+  private pruneHistory(): void {
+    for (const [id, job] of this.jobs) {
+      if (this.jobs.size <= this.maxHistory) {
+        break;
+      }
+      if (job.status === 'completed' || job.status === 'failed') {
+        this.jobs.delete(id);
+      }
+    }
+  }
+}
@@ -2,22 +2,39 @@
  * Python実行サービス - Pythonスクリプトを実行してAI推論を実施
  */
 
-import { exec } from 'child_process';
+import { exec, execFile, spawn } from 'child_process';
 import path from 'path';
 import fs from 'fs';
 import { promisify } from 'util';
-import { PredictionResult } from '../types';
+import {
+  PipelineProgress,
+  PredictionResult,
+  RetrainTrigger,
+  SignalHistoryPage,
+  SignalHistoryQuery,
+} from '../types';
 
 const execAsync = promisify(exec);
+const execFileAsync = promisify(execFile);
 
 const logger = console;
 
+// pipeline.py の進捗行の接頭辞
+const PIPELINE_PROGRESS_PREFIX = 'PIPELINE_PROGRESS ';
+
 export class PythonRunner {
   private pythonPath: string;
   private aiDir: string;
   private lastPredictionTime: Date | null = null;
   private predictionCache: PredictionResult | null = null;
   private cacheDuration: number = 300000; // 5分（ミリ秒）
+  private inflightPrediction: Promise<PredictionResult | null> | null = null;
+  private inflightExplain: boolean = false; // 実行中の推論が寄与度を計算するか
+  private cacheGeneration: number = 0; // clearCache() ごとに加算
+  private pythonAvailable: boolean | null = null;
+  private lastProbeTime: number = 0;
+  private probeDuration: number = 60000; // 1分（ミリ秒）
+  private inflightProbe: Promise<boolean> | null = null;
 
   constructor(pythonPath: string = 'python', aiDir: string = './ai') {
     this.pythonPath = pythonPath;
@@ -26,20 +43,60 @@ export class PythonRunner {
 
   /**
    * 推論を実行（Pythonスクリプト呼び出し）
+   *
+   * 実行中の推論があれば新たにプロセスを起動せず，その結果を共有する。
+   * 特徴量寄与度は重いので explain=true の場合のみ計算する
+   * （説明付きの結果は説明なしのリクエストにも使える）
    */
-  async predict(): Promise<PredictionResult | null> {
+  async predict(explain: boolean = false): Promise<PredictionResult | null> {
     // キャッシュをチェック
-    if (this.isCacheValid()) {
+    if (this.isCacheValid() && (!explain || this.hasExplanation(this.predictionCache))) {
       logger.log('🔄 Using cached prediction');
       return this.predictionCache;
     }
 
+    if (this.inflightPrediction !== null && (!explain || this.inflightExplain)) {
+      logger.log('⏳ Joining in-flight prediction');
+      return this.inflightPrediction;
+    }
+
+    const run: Promise<PredictionResult | null> = this.runPrediction(explain).finally(
+      () => {
+        // clearCache() 後や説明付きで開始し直した推論の参照は消さない
+        if (this.inflightPrediction === run) {
+          this.inflightPrediction = null;
+        }
+      }
+    );
+    this.inflightPrediction = run;
+    this.inflightExplain = explain;
+    return run;
+  }
+
+  /**
+   * 説明（寄与度）付きで計算された結果か
+   *
+   * アンサンブルなど寄与度を計算できないモデルでは explanation は null
+   */
+  private hasExplanation(prediction: PredictionResult | null): boolean {
+    return prediction !== null && prediction.explanation !== undefined;
+  }
+
+  /**
+   * predict.py を1回実行してキャッシュを更新
+   *
+   * 実行中に clearCache() された場合（学習完了など）は古いモデルの結果なので
+   * キャッシュには保存しない
+   */
+  private async runPrediction(explain: boolean): Promise<PredictionResult | null> {
+    const generation = this.cacheGeneration;
     try {
       logger.log('🔮 Executing Python prediction script...');
 
       // predict.py を実行
       const scriptPath = path.join(this.aiDir, 'predict.py');
-      const command = `${this.pythonPath} "${scriptPath}"`;
+      const command =
+        `${this.pythonPath} "${scriptPath}"` + (explain ? ' --explain' : '');
 
       const { stdout, stderr } = await execAsync(command, {
         cwd: this.aiDir,
@@ -59,9 +116,13 @@ export class PythonRunner {
 
       const prediction = JSON.parse(jsonMatch[0]) as PredictionResult;
       
-      // キャッシュを更新
-      this.predictionCache = prediction;
-      this.lastPredictionTime = new Date();
+      // キャッシュを更新（実行中にクリアされていなければ）
+      if (generation === this.cacheGeneration) {
+        this.predictionCache = prediction;
+        this.lastPredictionTime = new Date();
+      } else {
+        logger.log('⏭️  Discarding prediction started before cache was cleared');
+      }
 
       logger.log(`✅ Prediction obtained: ${prediction.signal}`);
       return prediction;
@@ -72,102 +133,173 @@ export class PythonRunner {
   }
 
   /**
-   * データ取得を実行
+   * シグナル履歴を期間指定で取得（signal_store.py query）
+   *
+   * クエリ値はシェルを経由せず引数として渡す
    */
-  async fetchData(): Promise<boolean> {
+  async querySignals(
+    query: SignalHistoryQuery
+  ): Promise<SignalHistoryPage | null> {
     try {
-      logger.log('📊 Executing Python data fetch...');
+      const scriptPath = path.join(this.aiDir, 'signal_store.py');
+      const args = [scriptPath, 'query', '--symbol', query.symbol];
 
-      const scriptPath = path.join(this.aiDir, 'fetch_data.py');
-      const command = `${this.pythonPath} "${scriptPath}"`;
+      if (query.start) {
+        args.push('--start', query.start);
+      }
+      if (query.end) {
+        args.push('--end', query.end);
+      }
+      if (query.limit) {
+        args.push('--limit', String(query.limit));
+      }
+      if (query.cursor) {
+        args.push('--cursor', query.cursor);
+      }
 
-      const { stderr } = await execAsync(command, {
+      const { stdout } = await execFileAsync(this.pythonPath, args, {
         cwd: this.aiDir,
-        timeout: 120000, // 2分のタイムアウト
+        timeout: 30000,
+        maxBuffer: 16 * 1024 * 1024,
       });
 
-      if (stderr && !stderr.includes('INFO')) {
-        logger.error('Python fetch error:', stderr);
-        return false;
-      }
-
-      logger.log('✅ Data fetch completed');
-      return true;
+      return JSON.parse(stdout) as SignalHistoryPage;
     } catch (error) {
-      logger.error('❌ Error fetching data:', error);
-      return false;
+      logger.error('❌ Error querying signal history:', error);
+      return null;
     }
   }
 
   /**
-   * 特徴量生成を実行
+   * 学習パイプライン（取得→特徴量→学習→評価→保存）を1プロセスで実行
+   *
+   * 標準出力の進捗行をステージの開始/完了ごとに onProgress へ渡す。
+   * 成否は終了コードで判定する（pipeline.py は失敗時に非ゼロ終了）
    */
-  async engineFeatures(): Promise<boolean> {
-    try {
-      logger.log('🔧 Executing Python feature engineering...');
+  runPipeline(
+    onProgress?: (progress: PipelineProgress) => void
+  ): Promise<boolean> {
+    logger.log('🚀 Executing Python training pipeline...');
 
-      const scriptPath = path.join(this.aiDir, 'feature_engineer.py');
-      const command = `${this.pythonPath} "${scriptPath}"`;
+    const scriptPath = path.join(this.aiDir, 'pipeline.py');
 
-      const { stderr } = await execAsync(command, {
+    return new Promise((resolve) => {
+      const child = spawn(this.pythonPath, [scriptPath], {
         cwd: this.aiDir,
-        timeout: 120000,
+        timeout: 540000, // 9分のタイムアウト
       });
 
-      if (stderr && !stderr.includes('INFO')) {
-        logger.error('Python feature error:', stderr);
-        return false;
-      }
+      let pending = '';
+      child.stdout.on('data', (chunk: Buffer) => {
+        pending += chunk.toString();
+        const lines = pending.split('\n');
+        pending = lines.pop() ?? '';
+
+        for (const line of lines) {
+          if (!onProgress || !line.startsWith(PIPELINE_PROGRESS_PREFIX)) {
+            continue;
+          }
+          try {
+            onProgress(
+              JSON.parse(
+                line.slice(PIPELINE_PROGRESS_PREFIX.length)
+              ) as PipelineProgress
+            );
+          } catch (error) {
+            logger.warn('⚠️  Malformed pipeline progress line:', line);
+          }
+        }
+      });
 
-      logger.log('✅ Feature engineering completed');
-      return true;
-    } catch (error) {
-      logger.error('❌ Error engineering features:', error);
-      return false;
-    }
-  }
+      // ログは標準エラー出力に出るので，失敗時の報告用に末尾だけ保持
+      let stderrTail = '';
+      child.stderr.on('data', (chunk: Buffer) => {
+        stderrTail = (stderrTail + chunk.toString()).slice(-8000);
+      });
 
-  /**
-   * モデル学習を実行
-   */
-  async trainModel(): Promise<boolean> {
-    try {
-      logger.log('🎓 Executing Python model training...');
+      child.on('error', (error) => {
+        logger.error('❌ Error running training pipeline:', error);
+        resolve(false);
+      });
 
-      const scriptPath = path.join(this.aiDir, 'train_model.py');
-      const command = `${this.pythonPath} "${scriptPath}"`;
+      child.on('close', (code) => {
+        if (code !== 0) {
+          logger.error(`Python pipeline exited with code ${code}:`, stderrTail);
+          resolve(false);
+          return;
+        }
 
-      const { stderr } = await execAsync(command, {
-        cwd: this.aiDir,
-        timeout: 300000, // 5分のタイムアウト
+        logger.log('✅ Training pipeline completed');
+        resolve(true);
       });
+    });
+  }
 
-      if (stderr && !stderr.includes('INFO')) {
-        logger.error('Python training error:', stderr);
-        return false;
-      }
+  /**
+   * Pythonが利用可能かチェック（プローブ結果をキャッシュ）
+   *
+   * 期限切れ時は前回の結果を返しつつバックグラウンドで再プローブする
+   */
+  async isPythonAvailable(): Promise<boolean> {
+    if (this.pythonAvailable === null) {
+      return this.probePython();
+    }
 
-      logger.log('✅ Model training completed');
-      
-      // 訓練後はキャッシュをクリア
-      this.predictionCache = null;
-      
-      return true;
-    } catch (error) {
-      logger.error('❌ Error training model:', error);
-      return false;
+    if (Date.now() - this.lastProbeTime >= this.probeDuration) {
+      this.probePython();
     }
+    return this.pythonAvailable;
   }
 
   /**
-   * Pythonが利用可能かチェック
+   * python --version を実行（同時実行は1つにまとめる）
    */
-  async isPythonAvailable(): Promise<boolean> {
+  private probePython(): Promise<boolean> {
+    if (this.inflightProbe !== null) {
+      return this.inflightProbe;
+    }
+
+    this.inflightProbe = execAsync(`${this.pythonPath} --version`, {
+      timeout: 5000,
+    })
+      .then(() => true)
+      .catch(() => false)
+      .then((available) => {
+        this.pythonAvailable = available;
+        this.lastProbeTime = Date.now();
+        this.inflightProbe = null;
+        return available;
+      });
+    return this.inflightProbe;
+  }
+
+  /**
+   * ドリフト監視の再学習トリガーを取得（出ていなければnull）
+   *
+   * predict.py の DriftMonitor.check() が書き，再学習で参照プロファイルを
+   * 保存すると削除される
+   */
+  getRetrainTrigger(): RetrainTrigger | null {
+    const triggerPath = path.join(
+      this.aiDir,
+      'models',
+      'retrain_trigger.json'
+    );
+    if (!fs.existsSync(triggerPath)) {
+      return null;
+    }
+
     try {
-      await execAsync(`${this.pythonPath} --version`, { timeout: 5000 });
-      return true;
-    } catch {
-      return false;
+      const report = JSON.parse(fs.readFileSync(triggerPath, 'utf-8'));
+      return {
+        // Python 側の timestamp はローカル時刻のためファイルの更新時刻を使う
+        detected_at: fs.statSync(triggerPath).mtime.toISOString(),
+        num_samples: report.num_samples,
+        drifted_columns: report.drifted_columns ?? [],
+      };
+    } catch (error) {
+      logger.error('❌ Failed to read retrain trigger:', error);
+      return null;
     }
   }
 
@@ -201,10 +333,14 @@ export class PythonRunner {
 
   /**
    * キャッシュをクリア
+   *
+   * 実行中の推論は結果をキャッシュせず，以降のリクエストは新しい推論を起動する
    */
   clearCache(): void {
+    this.cacheGeneration++;
     this.predictionCache = null;
     this.lastPredictionTime = null;
+    this.inflightPrediction = null;
     logger.log('🧹 Cache cleared');
   }
 
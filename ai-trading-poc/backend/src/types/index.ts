@@ -6,6 +6,8 @@ export interface PredictionResult {
   signal: 'LONG' | 'SHORT' | 'NO_TRADE';
   confidence: number;
   timestamp: string;
+  bar_timestamp: string;
+  model_version: string | null;
   predicted_class: number;
   class_probabilities: {
     SHORT: number;
@@ -18,6 +20,44 @@ export interface PredictionResult {
     rsi: number;
     hour: number;
   };
+  explanation?: SignalExplanation | null;
+}
+
+export interface SignalExplanation {
+  model_version: string | null;
+  bar_timestamp: string;
+  signal: 'LONG' | 'SHORT' | 'NO_TRADE';
+  base_value: number;
+  top_features: Array<{
+    feature: string;
+    contribution: number;
+  }>;
+}
+
+export interface SignalRecord {
+  timestamp: string;
+  signal: 'LONG' | 'SHORT' | 'NO_TRADE';
+  confidence: number;
+  predicted_class: number;
+  class_probabilities: {
+    SHORT: number;
+    LONG: number;
+    NO_TRADE: number;
+  };
+  model_version: string | null;
+}
+
+export interface SignalHistoryQuery {
+  symbol: string;
+  start?: string;
+  end?: string;
+  limit?: number;
+  cursor?: string;
+}
+
+export interface SignalHistoryPage {
+  items: SignalRecord[];
+  next_cursor: string | null;
 }
 
 export interface ApiResponse<T> {
@@ -31,6 +71,9 @@ export interface HealthStatus {
   status: 'healthy' | 'unhealthy';
   python_available: boolean;
   model_loaded: boolean;
+  retrain_recommended: boolean; // ドリフト監視の再学習トリガーが出ている
+  drifted_columns: string[];
+  drift_detected_at: string | null;
   api_timestamp: string;
 }
 
@@ -40,3 +83,34 @@ export interface SystemMetrics {
   last_prediction_time: string | null;
   total_predictions: number;
 }
+
+/**
+ * pipeline.py が標準出力に書くステージ進捗
+ */
+export interface PipelineProgress {
+  stage: string;
+  completed: number;
+  total: number;
+  skipped: boolean;
+}
+
+/**
+ * ドリフト監視の再学習トリガー（drift_monitor.py が models/retrain_trigger.json に書く）
+ */
+export interface RetrainTrigger {
+  detected_at: string; // トリガーファイルの更新時刻
+  num_samples: number;
+  drifted_columns: string[];
+}
+
+export interface TrainingJob {
+  id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  stage: string | null;
+  completed_stages: number;
+  total_stages: number;
+  error: string | null;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+}
@@ -3,10 +3,11 @@
  */
 
 import { useState, useEffect, useCallback } from 'react';
-import { PredictionResult, HealthStatus } from '../types';
+import { PredictionResult, HealthStatus, TrainingJob } from '../types';
 import axios from 'axios';
 
 const API_BASE_URL = 'http://localhost:5000';
+const TRAIN_POLL_INTERVAL = 5000; // 学習ジョブの状態確認間隔（ミリ秒）
 
 export function useSignal() {
   const [signal, setSignal] = useState<PredictionResult | null>(null);
@@ -78,7 +79,7 @@ export function useSignal() {
   }, []);
 
   /**
-   * モデルを再学習
+   * モデルを再学習（ジョブを登録して完了までポーリング）
    */
   const trainModel = useCallback(async () => {
     setLoading(true);
@@ -86,11 +87,23 @@ export function useSignal() {
     
     try {
       const response = await axios.post(`${API_BASE_URL}/api/train`);
-      if (response.data.success) {
+      if (!response.data.success) {
+        setError(response.data.error || 'Training failed');
+        return;
+      }
+
+      let job: TrainingJob = response.data.data;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, TRAIN_POLL_INTERVAL));
+        const status = await axios.get(`${API_BASE_URL}/api/train/jobs/${job.id}`);
+        job = status.data.data;
+      }
+
+      if (job.status === 'completed') {
         // 学習後にシグナルを再取得
         await fetchSignal();
       } else {
-        setError(response.data.error || 'Training failed');
+        setError(job.error || 'Training failed');
       }
     } catch (err) {
       const errorMsg = axios.isAxiosError(err)
@@ -41,6 +41,18 @@ export interface SystemMetrics {
   total_predictions: number;
 }
 
+export interface TrainingJob {
+  id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  stage: string | null;
+  completed_stages: number;
+  total_stages: number;
+  error: string | null;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+}
+
 export interface SignalStyle {
   bg: string;
   border: string;